@@ -0,0 +1,245 @@
+"""
+Offline load test for /api/generate-image and /api/edit-image.
+
+Runs the real FastAPI app in-process (httpx ASGI transport, SQLite, temp
+output dir) with `gemini_service.client` swapped for StubGeminiClient, so no
+network, MySQL or API key is needed.
+
+    cd app
+    python -m benchmarks.bench_api --scenario generate --requests 200 --concurrency 20
+    python -m benchmarks.bench_api --scenario edit --latency 0.5 --error-rate 0.05 --json bench.json
+    python -m benchmarks.bench_api --baseline bench.json   # exit 1 if p95/throughput regressed
+"""
+import os
+import io
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import resource
+import tempfile
+import statistics
+import tracemalloc
+
+SCENARIOS = ("generate", "generate-multi", "edit", "edit-upload")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="generate")
+    parser.add_argument("--requests", type=int, default=100, help="total requests to send")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent clients")
+    parser.add_argument("--latency", type=float, default=1.0, help="stub Gemini latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- uniform jitter on latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub calls that fail")
+    parser.add_argument("--image-size", type=int, default=1024, help="stub output edge in pixels")
+    parser.add_argument("--input-size", type=int, default=2048, help="edit input edge in pixels")
+    parser.add_argument("--backend", choices=("async", "thread"), default="async")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="GEMINI_MAX_CONCURRENCY override")
+    parser.add_argument("--repeat-prompts", action="store_true",
+                        help="reuse one prompt (exercises cache/single-flight instead of the API path)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="use tracemalloc for per-request allocation peaks (slows the run)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json result")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs baseline (0.2 = 20%%)")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def configure_environment(args, workdir: str):
+    """Settings are read at import time, so this must run before importing the app"""
+    os.chdir(workdir)
+    os.environ.update({
+        "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "benchmark"),
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+        "OUTPUT_DIR": "generated_images",
+        "GEMINI_BACKEND": args.backend,
+        "GEMINI_RATE_PER_MINUTE": "0",
+        "GEMINI_RETRY_BASE_DELAY": "0.05",
+        "IMAGE_CACHE_ENABLED": "true" if args.repeat_prompts else "false",
+        "ACCESS_LOG_SAMPLE_RATE": "0",
+        "RATE_LIMIT_STORAGE_URI": "memory://",
+    })
+    if args.max_concurrency:
+        os.environ["GEMINI_MAX_CONCURRENCY"] = str(args.max_concurrency)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LoopLagMonitor:
+    """Measures how late a 10 ms sleep wakes up — i.e. how long the loop was blocked"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+def make_input_image(size: int) -> bytes:
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.effect_noise((size, size), 64).convert("RGB").save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def build_request(args, index: int, input_image: bytes, input_b64: str):
+    prompt = "benchmark prompt" if args.repeat_prompts else f"benchmark prompt {index}"
+    if args.scenario == "generate":
+        return "POST", "/api/generate-image", {"json": {"prompt": prompt}}
+    if args.scenario == "generate-multi":
+        return "POST", "/api/generate-image", {"json": {"prompt": f"4 images of {prompt}"}}
+    if args.scenario == "edit":
+        return "POST", "/api/edit-image", {"json": {"prompt": prompt, "base64_image": input_b64}}
+    return "POST", "/api/edit-image/upload", {
+        "data": {"prompt": prompt}, "files": {"image": ("input.jpg", input_image, "image/jpeg")},
+    }
+
+
+async def run_benchmark(args) -> dict:
+    import httpx
+    import main as app_main
+    from core.rate_limit import limiter
+    from services import gemini_service
+    from benchmarks.stub_client import StubGeminiClient
+
+    stub = StubGeminiClient(args.latency, args.jitter, args.error_rate, args.image_size, seed=args.seed)
+    gemini_service.client = stub
+    # Per-client route limits and quotas would turn the run into a 429 benchmark
+    limiter.enabled = False
+
+    input_image = make_input_image(args.input_size) if args.scenario.startswith("edit") else b""
+    input_b64 = base64.b64encode(input_image).decode() if input_image else ""
+
+    latencies, statuses = [], {}
+    next_index = iter(range(args.requests))
+    monitor = LoopLagMonitor()
+
+    async with app_main.app.router.lifespan_context(app_main.app):
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            async def worker():
+                for index in next_index:
+                    method, url, kwargs = build_request(args, index, input_image, input_b64)
+                    started = time.perf_counter()
+                    response = await client.request(method, url, **kwargs)
+                    latencies.append(time.perf_counter() - started)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if args.trace_memory:
+                tracemalloc.start()
+            monitor.start()
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            await monitor.stop()
+            traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+            if args.trace_memory:
+                tracemalloc.stop()
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    await app_main.engine.dispose()
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    in_flight = min(args.concurrency, args.requests)
+    results = {
+        "scenario": args.scenario,
+        "backend": args.backend,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "stub_latency_s": args.latency,
+        "error_rate": args.error_rate,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "mean": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        "loop_lag_ms": {
+            "p99": round(percentile(monitor.samples, 99) * 1000, 2),
+            "max": round(max(monitor.samples, default=0) * 1000, 2),
+        },
+        "peak_rss_growth_per_inflight_kib": round((rss_after - rss_before) * rss_unit / 1024 / in_flight, 1),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "gemini_calls": stub.calls,
+        "gemini_injected_failures": stub.failures,
+    }
+    if traced_peak is not None:
+        results["traced_peak_per_inflight_kib"] = round(traced_peak / 1024 / in_flight, 1)
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return human-readable regressions beyond `tolerance`"""
+    regressions = []
+    for pct in ("p95", "p99"):
+        old, new = baseline["latency_ms"][pct], results["latency_ms"][pct]
+        if old and new > old * (1 + tolerance):
+            regressions.append(f"{pct} latency {old} ms -> {new} ms")
+    old, new = baseline["throughput_rps"], results["throughput_rps"]
+    if old and new < old * (1 - tolerance):
+        regressions.append(f"throughput {old} -> {new} req/s")
+    old, new = baseline["loop_lag_ms"]["p99"], results["loop_lag_ms"]["p99"]
+    if new > max(old * (1 + tolerance), old + 5):
+        regressions.append(f"event-loop lag p99 {old} ms -> {new} ms")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    with tempfile.TemporaryDirectory(prefix="gemini-bench-") as workdir:
+        cwd = os.getcwd()
+        configure_environment(args, workdir)
+        try:
+            results = asyncio.run(run_benchmark(args))
+        finally:
+            os.chdir(cwd)
+
+    print(json.dumps(results, indent=2))
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
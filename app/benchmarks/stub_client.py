@@ -0,0 +1,67 @@
+import io
+import time
+import random
+import asyncio
+from types import SimpleNamespace
+from PIL import Image
+from google.api_core import exceptions as google_exceptions
+
+
+class _StubModels:
+    def __init__(self, owner, is_async: bool):
+        self._owner = owner
+        self._is_async = is_async
+
+    def generate_content(self, model: str, contents: list, **kwargs):
+        if self._is_async:
+            return self._owner._generate_async()
+        return self._owner._generate_sync()
+
+
+class StubGeminiClient:
+    """
+    Drop-in stand-in for `genai.Client`, used as `gemini_service.client`.
+
+    Exposes both `client.models.generate_content` (sync, blocks for `latency`)
+    and `client.aio.models.generate_content` (async), so the real backends
+    run unchanged. Each call fails with ServiceUnavailable with probability
+    `error_rate`, otherwise returns a PNG of `image_size` x `image_size`.
+    """
+
+    def __init__(self, latency: float = 1.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 image_size: int = 1024, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._png = self._render_png(image_size)
+        self.models = _StubModels(self, is_async=False)
+        self.aio = SimpleNamespace(models=_StubModels(self, is_async=True))
+        self.calls = 0
+        self.failures = 0
+
+    @staticmethod
+    def _render_png(size: int) -> bytes:
+        # Noise, so the PNG is realistically sized rather than compressing to nothing
+        buffer = io.BytesIO()
+        Image.effect_noise((size, size), 64).convert("RGB").save(buffer, "PNG")
+        return buffer.getvalue()
+
+    def _next_delay(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _result(self):
+        self.calls += 1
+        if self._random.random() < self.error_rate:
+            self.failures += 1
+            raise google_exceptions.ServiceUnavailable("stub: injected failure")
+        part = SimpleNamespace(text=None, inline_data=SimpleNamespace(mime_type="image/png", data=self._png))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+    async def _generate_async(self):
+        await asyncio.sleep(self._next_delay())
+        return self._result()
+
+    def _generate_sync(self):
+        time.sleep(self._next_delay())
+        return self._result()
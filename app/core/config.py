@@ -12,6 +12,133 @@ DB_NAME = os.getenv("DB_NAME")
 class Settings:
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY")
     SERVER_HOST: str = os.getenv("SERVER_HOST", "http://localhost:9000")
-    DATABASE_URL: str = f"mysql+asyncmy://{DB_USER}:{DB_PASS}@{DB_HOST}:3306/{DB_NAME}"
+    # Any SQLAlchemy async URL, e.g. sqlite+aiosqlite:///./local.db for local load tests
+    DATABASE_URL: str = os.getenv("DATABASE_URL") or f"mysql+asyncmy://{DB_USER}:{DB_PASS}@{DB_HOST}:3306/{DB_NAME}"
+
+    # Connection pool (ignored for SQLite); size it to roughly workers x concurrent DB users
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # serve.py creates the schema once and turns this off for its workers
+    DB_CREATE_TABLES: bool = os.getenv("DB_CREATE_TABLES", "true").lower() == "true"
+
+    # Production launcher (serve.py)
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "0"))  # 0 = one worker per CPU
+    SHUTDOWN_GRACE_SECONDS: float = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "30"))  # drain time on SIGTERM
+
+    # Logging (JSON lines, written by a background listener thread)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # "file" (logs/app.log, rotated) or "stdout"; serve.py uses stdout for multiple workers,
+    # since several processes can't safely rotate one file
+    LOG_TARGET: str = os.getenv("LOG_TARGET", "file").lower()
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 ** 2)))
+    LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    ACCESS_LOG_SAMPLE_RATE: float = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.1"))  # errors/slow always logged
+    ACCESS_LOG_SLOW_MS: float = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000"))
+
+    # Gemini backend: "async" uses the SDK's native async client, "thread" runs
+    # the sync SDK in a bounded executor, "fake" uses a local stub model.
+    GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-image")
+    GEMINI_BACKEND: str = os.getenv("GEMINI_BACKEND", "async")
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "10"))
+    GEMINI_FAKE_LATENCY: float = float(os.getenv("GEMINI_FAKE_LATENCY", "1.0"))
+
+    # Retries, circuit breaker and quota pacing shared by all Gemini calls
+    GEMINI_RETRIES: int = int(os.getenv("GEMINI_RETRIES", "4"))
+    GEMINI_RETRY_BASE_DELAY: float = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "1.0"))
+    GEMINI_RETRY_MAX_DELAY: float = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "30"))
+    GEMINI_BREAKER_THRESHOLD: int = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+    GEMINI_BREAKER_RESET_SECONDS: float = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+    # Account-wide cap on Gemini calls, shared by all workers via RATE_LIMIT_STORAGE_URI; 0 = unpaced
+    GEMINI_RATE_PER_MINUTE: int = int(os.getenv("GEMINI_RATE_PER_MINUTE", "0"))
+
+    # Hedged Gemini calls: a backup request once a call runs past the given latency
+    # percentile; first success wins. The budget caps backups as a fraction of calls.
+    GEMINI_HEDGE_ENABLED: bool = os.getenv("GEMINI_HEDGE_ENABLED", "false").lower() == "true"
+    GEMINI_HEDGE_PERCENTILE: float = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+    GEMINI_HEDGE_BUDGET: float = float(os.getenv("GEMINI_HEDGE_BUDGET", "0.1"))
+    GEMINI_HEDGE_MIN_DELAY: float = float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "2.0"))  # seconds
+
+    # Request rate limits + per-client image quotas, shared by every worker through the storage.
+    # sqlite:///<file> (one host), redis://host:6379 (needs the redis package) or memory:// (per process)
+    RATE_LIMIT_STORAGE_URI: str = os.getenv("RATE_LIMIT_STORAGE_URI", "sqlite:///ratelimit.db")
+    RATE_LIMIT_STRATEGY: str = os.getenv("RATE_LIMIT_STRATEGY", "sliding-window-counter")
+    RATE_LIMIT_DEFAULT: str = os.getenv("RATE_LIMIT_DEFAULT", "10/minute")
+    API_KEY_HEADER: str = os.getenv("API_KEY_HEADER", "X-API-Key")
+    # Keys that get their own limits (comma-separated); unknown keys are limited by IP.
+    # Keys listed in IMAGE_QUOTA_OVERRIDES are known too.
+    API_KEYS: set = {key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip()}
+    IMAGE_QUOTA: str = os.getenv("IMAGE_QUOTA", "100/hour")  # images, not requests; empty = no quota
+    # Per-key overrides, e.g. "key1=1000/hour;key2=50/day"
+    IMAGE_QUOTA_OVERRIDES: dict = dict(
+        item.split("=", 1) for item in os.getenv("IMAGE_QUOTA_OVERRIDES", "").split(";") if "=" in item
+    )
+
+    # Generated image output + result cache
+    OUTPUT_DIR: str = os.getenv("OUTPUT_DIR", "generated_images")
+    IMAGE_CACHE_ENABLED: bool = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+    IMAGE_CACHE_MAX_ENTRIES: int = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "1024"))
+    IMAGE_CACHE_TTL_SECONDS: int = int(os.getenv("IMAGE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    # Edit result cache: near-duplicate input image + same prompt -> stored result
+    EDIT_CACHE_ENABLED: bool = os.getenv("EDIT_CACHE_ENABLED", "true").lower() == "true"
+    EDIT_CACHE_MAX_DISTANCE: int = int(os.getenv("EDIT_CACHE_MAX_DISTANCE", "6"))  # Hamming distance, of 64 bits
+
+    # Image storage: "local" (hash-sharded under OUTPUT_DIR) or "s3" (any S3-compatible store, e.g. MinIO)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "local")
+    STORAGE_SHARD_DEPTH: int = int(os.getenv("STORAGE_SHARD_DEPTH", "2"))  # ab/cd/<file>
+    S3_BUCKET: str = os.getenv("S3_BUCKET", "")
+    S3_PREFIX: str = os.getenv("S3_PREFIX", "")
+    S3_ENDPOINT_URL: str = os.getenv("S3_ENDPOINT_URL") or None  # e.g. http://localhost:9000 for MinIO
+    S3_REGION: str = os.getenv("S3_REGION") or None
+    S3_PUBLIC_URL: str = os.getenv("S3_PUBLIC_URL", "")  # bucket/CDN base URL; empty = presigned URLs
+    S3_URL_EXPIRY_SECONDS: int = int(os.getenv("S3_URL_EXPIRY_SECONDS", str(24 * 3600)))
+
+    # Background GC of stored images and their ImageLog rows; opt-in (both 0 = keep every image)
+    STORAGE_RETENTION_DAYS: float = float(os.getenv("STORAGE_RETENTION_DAYS", "0"))  # 0 = keep forever
+    STORAGE_MAX_BYTES: int = int(os.getenv("STORAGE_MAX_BYTES", os.getenv("IMAGE_CACHE_MAX_BYTES", "0")))  # 0 = no cap
+    STORAGE_GC_INTERVAL_SECONDS: float = float(os.getenv("STORAGE_GC_INTERVAL_SECONDS", "3600"))
+    STORAGE_GC_BATCH_SIZE: int = int(os.getenv("STORAGE_GC_BATCH_SIZE", "500"))
+
+    # Batched ImageLog/ErrorLog writes
+    LOG_WRITER_BATCH_SIZE: int = int(os.getenv("LOG_WRITER_BATCH_SIZE", "200"))
+    LOG_WRITER_FLUSH_SECONDS: float = float(os.getenv("LOG_WRITER_FLUSH_SECONDS", "1.0"))
+    LOG_WRITER_MAX_QUEUE: int = int(os.getenv("LOG_WRITER_MAX_QUEUE", "10000"))
+
+    # Background generation jobs (/api/jobs)
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_QUEUE_MAXSIZE: int = int(os.getenv("JOB_QUEUE_MAXSIZE", "1000"))
+    # Running jobs renew a lease every third of this; on startup, jobs left "running" longer are re-queued
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+    # POST /api/generate-batch: max prompts per call, and how many of one batch's
+    # images may wait on the shared Gemini budget at once (keeps batches from starving other requests)
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+    BATCH_MAX_IN_FLIGHT: int = int(os.getenv("BATCH_MAX_IN_FLIGHT", "0"))  # 0 = half of GEMINI_MAX_CONCURRENCY
+
+    # GET /api/images (generation history)
+    HISTORY_PAGE_SIZE: int = int(os.getenv("HISTORY_PAGE_SIZE", "100"))
+    HISTORY_MAX_PAGE_SIZE: int = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "1000"))
+
+    # Image decode/encode + disk writes (0 process workers = encode on threads)
+    IMAGE_THREAD_WORKERS: int = int(os.getenv("IMAGE_THREAD_WORKERS", "4"))
+    IMAGE_PROCESS_WORKERS: int = int(os.getenv("IMAGE_PROCESS_WORKERS", "2"))
+
+    # On-demand thumbnails / format variants served by /media/<file>?w=&fmt=
+    VARIANT_WIDTHS: set = {int(w) for w in os.getenv("VARIANT_WIDTHS", "64,128,256,512,1024").split(",") if w.strip()}
+    VARIANT_QUALITY: int = int(os.getenv("VARIANT_QUALITY", "80"))
+    VARIANT_CACHE_MAX_BYTES: int = int(os.getenv("VARIANT_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+
+    # Limits for /api/edit-image uploads (checked from headers, before decoding)
+    EDIT_MAX_UPLOAD_BYTES: int = int(os.getenv("EDIT_MAX_UPLOAD_BYTES", str(20 * 1024 ** 2)))
+    EDIT_MAX_PIXELS: int = int(os.getenv("EDIT_MAX_PIXELS", str(50_000_000)))
+
+    # Default input preprocessing before images are sent to Gemini
+    PREPROCESS_ENABLED: bool = os.getenv("PREPROCESS_ENABLED", "true").lower() == "true"
+    PREPROCESS_MAX_EDGE: int = int(os.getenv("PREPROCESS_MAX_EDGE", "1536"))
+    PREPROCESS_FORMAT: str = os.getenv("PREPROCESS_FORMAT", "JPEG")
+    PREPROCESS_QUALITY: int = int(os.getenv("PREPROCESS_QUALITY", "85"))
 
 settings = Settings()
\ No newline at end of file
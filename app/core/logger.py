@@ -1,13 +1,90 @@
-import logging
 import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from core.config import settings
 
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, "app.log"),
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# Set per request by the middleware in main.py, attached to every record
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else came in via `extra=` and is emitted as a field
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """Runs on the calling thread, so it sees the request's contextvar"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of routine records; errors and slow requests are always kept"""
+
+    def __init__(self, rate: float, slow_ms: float):
+        super().__init__()
+        self.rate = rate
+        self.slow_ms = slow_ms
+
+    def filter(self, record):
+        if getattr(record, "status", 0) >= 400 or getattr(record, "duration_ms", 0) >= self.slow_ms:
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+# ✅ Callers only enqueue records; a listener thread formats and writes them out
+_log_queue = queue.SimpleQueue()
+
+if settings.LOG_TARGET == "stdout":
+    _output_handler = logging.StreamHandler(sys.stdout)
+else:
+    _output_handler = RotatingFileHandler(
+        os.path.join(LOG_DIR, "app.log"),
+        maxBytes=settings.LOG_MAX_BYTES,
+        backupCount=settings.LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+_output_handler.setFormatter(JsonFormatter())
+
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))  # fields are added by JsonFormatter
+_queue_handler.addFilter(RequestIdFilter())
+
+logging.basicConfig(level=settings.LOG_LEVEL, handlers=[_queue_handler])
+
+log_listener = QueueListener(_log_queue, _output_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
 
 logger = logging.getLogger("gemini_app")
+
+# High-volume per-request line, sampled
+access_logger = logging.getLogger("gemini_app.access")
+access_logger.addFilter(SamplingFilter(settings.ACCESS_LOG_SAMPLE_RATE, settings.ACCESS_LOG_SLOW_MS))
@@ -0,0 +1,233 @@
+import os
+import time
+import sqlite3
+import asyncio
+import hashlib
+import functools
+import threading
+from math import floor
+from fastapi import Request
+from limits import parse
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from core.config import settings
+from core.logger import logger
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    `limits` storage in a local SQLite file, so every worker process on the
+    host shares the same counters. Registered for `sqlite:///<path>` URIs.
+    Supports the fixed-window and sliding-window-counter strategies; each
+    sliding-window check-and-increment is a single IMMEDIATE transaction, so
+    concurrent workers can't overshoot a limit.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    # Expired windows are deleted every N writes
+    PURGE_EVERY = 500
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        self.path = uri.split("://", 1)[1].removeprefix("/") or "ratelimit.db"
+        self._local = threading.local()
+        self._writes = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits "
+                "(key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)"
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    @staticmethod
+    def _read(conn, key: str, now: float):
+        row = conn.execute("SELECT count, expires FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return 0, now
+        return row
+
+    def _incr(self, conn, key: str, expiry: float, amount: int, now: float) -> int:
+        count, expires = self._read(conn, key, now)
+        if count == 0:
+            expires = now + expiry
+        conn.execute(
+            "INSERT OR REPLACE INTO rate_limits (key, count, expires) VALUES (?, ?, ?)",
+            (key, count + amount, expires),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM rate_limits WHERE expires <= ?", (now,))
+        return count + amount
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        conn = self._transaction()
+        try:
+            count = self._incr(conn, key, expiry, amount, time.time())
+            conn.execute("COMMIT")
+            return count
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key: str) -> int:
+        return self._read(self._connection(), key, time.time())[0]
+
+    def get_expiry(self, key: str) -> float:
+        return self._read(self._connection(), key, time.time())[1]
+
+    def clear(self, key: str) -> None:
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    def reset(self) -> int:
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _window_info(self, conn, key: str, expiry: int, now: float):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._read(conn, previous_key, now)[0]
+        current_count = self._read(conn, current_key, now)[0]
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        conn = self._transaction()
+        try:
+            previous_count, previous_ttl, current_count, _ = self._window_info(conn, key, expiry, now)
+            weighted = previous_count * previous_ttl / expiry + current_count
+            allowed = floor(weighted) + amount <= limit
+            if allowed:
+                # Twice the window, so the counter is still there as "previous" in the next one
+                self._incr(conn, self.sliding_window_keys(key, expiry, now)[1], 2 * expiry, amount, now)
+            conn.execute("COMMIT")
+            return allowed
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_sliding_window(self, key: str, expiry: int):
+        return self._window_info(self._connection(), key, expiry, time.time())
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        for window_key in self.sliding_window_keys(key, expiry, time.time()):
+            self.clear(window_key)
+
+
+def _digest(api_key: str) -> str:
+    # Raw keys never reach the limiter storage
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+# Only configured keys get their own buckets; otherwise a fresh random key per
+# request would be a fresh bucket per request
+KNOWN_KEY_DIGESTS = {_digest(key) for key in settings.API_KEYS | set(settings.IMAGE_QUOTA_OVERRIDES)}
+
+
+def client_key(request: Request) -> str:
+    """Rate-limit identity: a known API key when one is sent, otherwise the client IP"""
+    api_key = request.headers.get(settings.API_KEY_HEADER)
+    if api_key:
+        digest = _digest(api_key)
+        if digest in KNOWN_KEY_DIGESTS:
+            return f"key:{digest}"
+    return f"ip:{get_remote_address(request)}"
+
+
+class ThreadedLimiter(Limiter):
+    """
+    slowapi checks route limits synchronously, i.e. on the event loop. With
+    shared storage that check is a SQLite transaction (up to the 5 s busy
+    timeout under contention) or a Redis round trip, so for async endpoints
+    it runs in a worker thread instead and only that request waits.
+    """
+
+    def limit(self, *args, **kwargs):
+        decorate = super().limit(*args, **kwargs)
+
+        def decorator(func):
+            limited = decorate(func)
+            if not asyncio.iscoroutinefunction(func):
+                return limited
+
+            @functools.wraps(limited)
+            async def wrapper(*f_args, **f_kwargs):
+                request = f_kwargs.get("request")
+                if (self.enabled and self._auto_check and isinstance(request, Request)
+                        and not getattr(request.state, "_rate_limiting_complete", False)):
+                    # Raises RateLimitExceeded; the slowapi wrapper then skips its own check
+                    await asyncio.to_thread(self._check_request_limit, request, func, False)
+                    request.state._rate_limiting_complete = True
+                return await limited(*f_args, **f_kwargs)
+
+            return wrapper
+
+        return decorator
+
+
+# ✅ The one limiter used by main.py and every router
+limiter = ThreadedLimiter(
+    key_func=client_key,
+    default_limits=[settings.RATE_LIMIT_DEFAULT],
+    storage_uri=settings.RATE_LIMIT_STORAGE_URI,
+    strategy=settings.RATE_LIMIT_STRATEGY,
+    in_memory_fallback_enabled=not settings.RATE_LIMIT_STORAGE_URI.startswith("memory://"),
+)
+
+DEFAULT_QUOTA = parse(settings.IMAGE_QUOTA) if settings.IMAGE_QUOTA else None
+QUOTA_OVERRIDES = {f"key:{_digest(key)}": parse(value) for key, value in settings.IMAGE_QUOTA_OVERRIDES.items()}
+
+
+def _charge(identity: str, cost: int):
+    quota = QUOTA_OVERRIDES.get(identity, DEFAULT_QUOTA)
+    if quota is None:
+        return None
+    strategy = limiter.limiter
+    if strategy.hit(quota, "quota", identity, cost=cost):
+        return None
+    reset_time, _ = strategy.get_window_stats(quota, "quota", identity)
+    return max(1.0, reset_time - time.time())
+
+
+async def charge_quota(request: Request, cost: int = 1):
+    """
+    Spend `cost` images from the caller's quota (a 10-image prompt costs 10).
+    Returns None when allowed, otherwise seconds until enough quota frees up.
+    """
+    if not limiter.enabled:
+        return None
+    identity = client_key(request)
+    try:
+        return await asyncio.to_thread(_charge, identity, cost)
+    except Exception as e:
+        # Fail open: a limiter outage shouldn't take the API down with it
+        logger.warning(f"⚠️ Quota check failed for {identity}, allowing request: {e}")
+        return None
@@ -1,42 +1,98 @@
+import os
+import time
+import uuid
 import uvicorn
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from routes import image_routes
-from core.database import Base, engine
-from core.logger import logger
+from routes import image_routes, job_routes, media_routes, metrics_routes, history_routes
+from core.database import engine, create_tables
+from core.config import settings
+from core.rate_limit import limiter
+from core.logger import logger, access_logger, request_id_var
+from core.metrics import HTTP_REQUEST_SECONDS
+from services.job_service import job_manager
+from services import gemini_service
+from services.image_processing import shutdown_executors
+from services.log_writer import log_writer
+from services.storage_gc import storage_gc
+from services.history_service import backfill_prompt_digests
 
 # Initialize app
 app = FastAPI(title="Gemini Image API", version="2.0")
 
-# ✅ Create limiter (example: max 10 calls per minute per IP)
-limiter = Limiter(key_func=get_remote_address, default_limits=["10/minute"])
+# ✅ Shared limiter (core/rate_limit.py): counters live in RATE_LIMIT_STORAGE_URI, so
+# limits hold across all worker processes, keyed by API key or client IP
 app.state.limiter = limiter
 
 # ✅ Register handler for rate-limit errors
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
-# ✅ Mount static files
-app.mount("/static", StaticFiles(directory="."), name="static")
+# ✅ Mount static files — only the output directory, kept for old /static/generated_images/ URLs.
+# New URLs use /media/ (see routes/media_routes.py) for ETag + immutable caching.
+os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
+app.mount("/static/generated_images", media_routes.MediaStaticFiles(directory=settings.OUTPUT_DIR), name="static")
 
 # ✅ Include routers
 app.include_router(image_routes.router)
+app.include_router(job_routes.router)
+app.include_router(history_routes.router)
+app.include_router(media_routes.router)
+app.include_router(metrics_routes.router)
 
 @app.on_event("startup")
 async def startup_event():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    logger.info("✅ Database and tables initialized successfully")
+    if settings.DB_CREATE_TABLES:
+        await create_tables()
+        await backfill_prompt_digests()
+        logger.info("✅ Database and tables initialized successfully")
+    log_writer.start()
+    await job_manager.start()
+    storage_gc.start()
 
-# ✅ Example of global middleware logging
+@app.on_event("shutdown")
+async def shutdown_event():
+    # uvicorn has already stopped accepting and waited for open requests;
+    # let running jobs finish their Gemini calls before tearing down
+    await storage_gc.stop()
+    await job_manager.stop(timeout=settings.SHUTDOWN_GRACE_SECONDS)
+    await log_writer.stop()
+    gemini_service.backend.shutdown()
+    shutdown_executors()
+    await engine.dispose()
+
+# ✅ Access logging: tags the request with an ID and enqueues one sampled, structured line
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"Incoming request: {request.method} {request.url}")
-    response = await call_next(request)
-    return response
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        # Label by route template, not raw path, to keep metric cardinality bounded
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            elapsed, method=request.method, route=getattr(route, "path", "unmatched"), status=status
+        )
+        access_logger.info(
+            "%s %s %s", request.method, request.url.path, status,
+            extra={
+                "method": request.method,
+                "path": request.url.path,
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 2),
+                "client": request.client.host if request.client else None,
+            },
+        )
+        request_id_var.reset(token)
 
+# Development entry point; use serve.py for multi-worker production runs
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=9000, reload=True)
 
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, func
+from core.database import Base
+
+class EditResult(Base):
+    __tablename__ = "edit_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    prompt_digest = Column(String(32), nullable=False, index=True)  # model + prompt
+    phash = Column(BigInteger, nullable=False)  # 64-bit perceptual hash of the input, stored signed
+    image_path = Column(String(255), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,13 +1,30 @@
-
-from sqlalchemy import Column, Integer, String, DateTime, func
+import hashlib
+from sqlalchemy import Column, Integer, String, DateTime, Index, func
 from core.database import Base
 
+
+def digest_prompt(prompt: str) -> str:
+    """Indexed lookup key for a prompt (exact match after trimming whitespace)"""
+    return hashlib.sha256(prompt.strip().encode("utf-8")).hexdigest()[:32]
+
+
+def _prompt_digest_default(context):
+    return digest_prompt(context.get_current_parameters()["prompt"])
+
+
 class ImageLog(Base):
     __tablename__ = "image_logs"
-
+    __table_args__ = (
+        # History queries (GET /api/images) walk these newest-first; the primary key
+        # breaks ties within one timestamp
+        Index("ix_image_logs_created_at", "created_at", "id"),
+        Index("ix_image_logs_type_created_at", "type", "created_at", "id"),
+        Index("ix_image_logs_prompt_digest_created_at", "prompt_digest", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     prompt = Column(String(500), nullable=False)
-    image_path = Column(String(255), nullable=True)
+    prompt_digest = Column(String(32), nullable=True, default=_prompt_digest_default)  # filled from prompt on insert
+    image_path = Column(String(255), nullable=True, index=True)  # storage GC deletes rows by file
     type = Column(String(50), nullable=False)  # "generate" or "edit"
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Text, DateTime, func
+from core.database import Base
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id = Column(String(36), primary_key=True)
+    prompt = Column(String(500), nullable=False)
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued, running, done, failed
+    image_paths = Column(Text, nullable=True)  # JSON list of generated paths
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
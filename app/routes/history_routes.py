@@ -0,0 +1,70 @@
+import json
+from datetime import datetime
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from core.config import settings
+from core.database import SessionLocal
+from core.logger import logger
+from services.history_service import history_query, encode_cursor, InvalidCursor
+from utils.response_utils import error_response, build_image_url
+
+router = APIRouter(prefix="/api", tags=["History"])
+
+
+def _history_item(row) -> dict:
+    return {
+        "id": row.id,
+        "prompt": row.prompt,
+        "type": row.type,
+        "image_url": build_image_url(row.image_path) if row.image_path else None,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    }
+
+
+async def _history_stream(query, limit: int):
+    """
+    Writes the page as the rows arrive from a server-side cursor, so neither
+    the database result nor the JSON body is held in memory at once.
+    """
+    yield '{"status": true, "items": ['
+    count, last, next_cursor, error = 0, None, None, None
+    try:
+        async with SessionLocal() as db:
+            result = await db.stream(query)
+            async for row in result:
+                if count == limit:
+                    # The extra row only says there is another page
+                    next_cursor = encode_cursor(last.created_at, last.id)
+                    break
+                yield ("," if count else "") + json.dumps(_history_item(row))
+                count += 1
+                last = row
+            await result.close()
+    except Exception as e:
+        logger.error(f"History query failed after {count} row(s): {e}")
+        error = "History query failed"
+    tail = {"count": count, "next_cursor": next_cursor}
+    if error:
+        tail["error"] = error
+    yield "], " + json.dumps(tail)[1:]
+
+
+@router.get("/images")
+async def list_images_endpoint(
+    type_: str = Query(None, alias="type", description="generate or edit"),
+    prompt: str = Query(None, description="exact prompt (leading/trailing whitespace ignored)"),
+    since: datetime = Query(None, description="created at or after (ISO 8601, UTC if no offset)"),
+    until: datetime = Query(None, description="created before (ISO 8601)"),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(None, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+):
+    """
+    Generation history, newest first. Pass `next_cursor` back as `cursor` to get
+    the next page; it is null on the last one.
+    """
+    limit = limit or settings.HISTORY_PAGE_SIZE
+    try:
+        query = history_query(type_, prompt, since, until, cursor, limit)
+    except InvalidCursor as e:
+        return error_response(str(e), 400)
+    return StreamingResponse(_history_stream(query, limit), media_type="application/json")
@@ -1,22 +1,33 @@
-from fastapi import APIRouter, Depends, Request
-from sqlalchemy.ext.asyncio import AsyncSession
-from slowapi.util import get_remote_address
-from slowapi import Limiter
-from schemas.image_schema import ImageRequest, ImageEditRequest
-from services.gemini_service import generate_image, edit_image, GeminiServiceError
-from core.database import get_db
+import json
+import tempfile
+from fastapi import APIRouter, Request
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from fastapi.responses import StreamingResponse
+from schemas.image_schema import ImageRequest, ImageEditRequest, BatchRequest, BatchItem
+from services.gemini_service import (
+    generate_image, edit_image, edit_image_bytes, validate_image_header, extract_image_count,
+    iter_batch_results, GeminiServiceError,
+)
+from services.image_processing import run_in_image_pool
+from services.image_preprocess import PreprocessOptions
 from models.image_log import ImageLog
-from utils.response_utils import success_response, error_response
+from utils.response_utils import success_response, error_response, build_image_url, quota_exceeded_response
 from utils.error_utils import log_error
+from services.log_writer import log_writer
 from core.config import settings
+from core.logger import logger
+from core.rate_limit import limiter, charge_quota
 
 router = APIRouter(prefix="/api", tags=["Image"])
 
-# ✅ Get limiter instance from app
-limiter = Limiter(key_func=get_remote_address)
+# Raw uploads stay in memory up to this size, then spill to a temp file
+UPLOAD_SPOOL_BYTES = 1024 * 1024
+
+# Input preprocessing for the edit routes (override per route if needed)
+EDIT_PREPROCESS = PreprocessOptions.from_settings()
 
 @router.post("/generate-image")
-@limiter.limit("5/minute")  # 👈 Limit this route to 5 requests per minute per IP
+@limiter.limit("5/minute")  # 👈 Limit this route to 5 requests per minute per API key / IP
 
 # ****************** Handle urls of Multiple Images ******************
 # async def generate_image_endpoint(payload: ImageRequest, request: Request, db: AsyncSession = Depends(get_db)):
@@ -34,50 +45,183 @@ limiter = Limiter(key_func=get_remote_address)
 #         return error_response("Internal server error", 500)
 
 
-async def generate_image_endpoint(payload: ImageRequest, request: Request, db: AsyncSession = Depends(get_db)):
+async def generate_image_endpoint(payload: ImageRequest, request: Request):
     """
     Handles both single and multi-image prompts (like "10 images of good morning").
     Automatically detects count, generates concurrently, logs results, and returns URLs.
     """
+    # Quota is counted in images, so "10 images of ..." costs 10
+    retry_after = await charge_quota(request, extract_image_count(payload.prompt))
+    if retry_after:
+        return quota_exceeded_response(retry_after)
+
     try:
         # Generate one or more images based on the prompt
         image_paths = await generate_image(payload.prompt)  # returns list of paths
-        logger_msg = f"Generated {len(image_paths)} image(s) for prompt: {payload.prompt}"
-        print(logger_msg)
+        logger.info("Generated %d image(s) for prompt: %s", len(image_paths), payload.prompt)
 
-        # Store all generated images in the database
+        # Queue all generated images for a batched database write
         for path in image_paths:
-            db.add(ImageLog(prompt=payload.prompt, image_path=path, type="generate"))
-        await db.commit()
+            log_writer.add(ImageLog, prompt=payload.prompt, image_path=path, type="generate")
 
         # Build full accessible URLs
-        image_urls = [f"{settings.SERVER_HOST}/static/{path}" for path in image_paths]
+        image_urls = [build_image_url(path) for path in image_paths]
 
         # Dynamic message depending on count
         msg = "Image generated successfully" if len(image_urls) == 1 else f"{len(image_urls)} images generated successfully"
         return success_response(msg, image_urls)
 
     except GeminiServiceError as e:
-        await log_error(db, "generate_image", e.error_type, e.message, payload.prompt)
+        log_error("generate_image", e.error_type, e.message, payload.prompt)
         return error_response(e.message, 400)
 
     except Exception as e:
-        await log_error(db, "generate_image", "UnknownError", str(e), payload.prompt)
+        log_error("generate_image", "UnknownError", str(e), payload.prompt)
         return error_response("Internal server error", 500)
 
 
+@router.post("/generate-batch")
+@limiter.limit("2/minute")
+async def generate_batch_endpoint(payload: BatchRequest, request: Request):
+    """
+    Many prompts in one call. Streams NDJSON: one line per prompt as soon as it
+    finishes (completion order, tagged with `index` and the caller's `id`),
+    then a summary line. Each item may set `count` to override the detected image count.
+    """
+    if len(payload.items) > settings.BATCH_MAX_ITEMS:
+        return error_response(f"A batch may contain at most {settings.BATCH_MAX_ITEMS} items", 400)
+
+    counts = [item.count or extract_image_count(item.prompt) for item in payload.items]
+    retry_after = await charge_quota(request, sum(counts))
+    if retry_after:
+        return quota_exceeded_response(retry_after)
+
+    logger.info(f"Batch of {len(payload.items)} prompt(s), {sum(counts)} image(s)")
+    return StreamingResponse(_batch_stream(payload.items, counts), media_type="application/x-ndjson")
+
+
+async def _batch_stream(items: list[BatchItem], counts: list[int]):
+    rows = []
+    failed = 0
+    try:
+        results = iter_batch_results(
+            [(item.prompt, count) for item, count in zip(items, counts)], settings.BATCH_MAX_IN_FLIGHT or None
+        )
+        async for index, paths, error in results:
+            item = items[index]
+            line = {"index": index, "id": item.id}
+            if error:
+                failed += 1
+                log_error("generate_batch", error.error_type, error.message, item.prompt)
+                line.update(status=False, message=error.message, error_type=error.error_type)
+            else:
+                rows.extend({"prompt": item.prompt, "image_path": path, "type": "generate"} for path in paths)
+                line.update(status=True, image_urls=[build_image_url(path) for path in paths])
+            yield json.dumps(line) + "\n"
+        summary = {"done": True, "succeeded": len(items) - failed, "failed": failed, "images": len(rows)}
+        yield json.dumps(summary) + "\n"
+    finally:
+        # Every image of the batch in one bulk INSERT, even if the client went away mid-stream
+        log_writer.add_many(ImageLog, rows)
+
+
 @router.post("/edit-image")
-@limiter.limit("3/minute")  # 👈 Limit this route to 3 requests per minute per IP
-async def edit_image_endpoint(payload: ImageEditRequest, request: Request, db: AsyncSession = Depends(get_db)):
+@limiter.limit("3/minute")  # 👈 Limit this route to 3 requests per minute per API key / IP
+async def edit_image_endpoint(payload: ImageEditRequest, request: Request):
+    retry_after = await charge_quota(request)
+    if retry_after:
+        return quota_exceeded_response(retry_after)
     try:
-        path = await edit_image(payload.prompt, payload.base64_image)
-        db.add(ImageLog(prompt=payload.prompt, image_path=path, type="edit"))
-        await db.commit()
-        full_url = f"{settings.SERVER_HOST}/static/{path}"
+        path = await edit_image(payload.prompt, payload.base64_image, EDIT_PREPROCESS)
+        log_writer.add(ImageLog, prompt=payload.prompt, image_path=path, type="edit")
+        full_url = build_image_url(path)
         return success_response("Image edited successfully", full_url)
     except GeminiServiceError as e:
-        await log_error(db, "edit_image", e.error_type, e.message, payload.prompt)
-        return error_response(e.message, 400)
+        log_error("edit_image", e.error_type, e.message, payload.prompt)
+        return error_response(e.message, 413 if e.error_type == "PayloadTooLarge" else 400)
+    except Exception as e:
+        log_error("edit_image", "UnknownError", str(e), payload.prompt)
+        return error_response("Internal server error", 500)
+
+
+async def _edit_from_file(request: Request, prompt: str, image_file, size: int, preprocess: PreprocessOptions):
+    """Shared path for binary uploads: header check, quota, one read, edit, log."""
+    try:
+        validate_image_header(image_file, size)
+        # Charged only once the body is in and looks like an image
+        retry_after = await charge_quota(request)
+        if retry_after:
+            return quota_exceeded_response(retry_after)
+        image_data = await run_in_image_pool(image_file.read)
+        path = await edit_image_bytes(prompt, image_data, preprocess)
+        log_writer.add(ImageLog, prompt=prompt, image_path=path, type="edit")
+        full_url = build_image_url(path)
+        return success_response("Image edited successfully", full_url)
+    except GeminiServiceError as e:
+        log_error("edit_image", e.error_type, e.message, prompt)
+        return error_response(e.message, 413 if e.error_type == "PayloadTooLarge" else 400)
     except Exception as e:
-        await log_error(db, "edit_image", "UnknownError", str(e), payload.prompt)
-        return error_response("Internal server error", 500)
\ No newline at end of file
+        log_error("edit_image", "UnknownError", str(e), prompt)
+        return error_response("Internal server error", 500)
+
+
+# Multipart upload: room for the prompt field and part headers on top of the image
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+UPLOAD_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["prompt", "image"],
+            "properties": {"prompt": {"type": "string"}, "image": {"type": "string", "format": "binary"}},
+        }}},
+    }
+}
+
+
+@router.post("/edit-image/upload", openapi_extra=UPLOAD_FORM_SCHEMA)
+@limiter.limit("3/minute")
+async def edit_image_upload_endpoint(request: Request):
+    """
+    multipart/form-data variant of /edit-image (fields: prompt, image) — no base64 inflation.
+    The form is parsed here, after the Content-Length check, so oversized uploads are
+    refused before they are received (FastAPI would spool the whole file first).
+    """
+    declared_size = request.headers.get("content-length")
+    if not declared_size or not declared_size.isdigit():
+        return error_response("Content-Length is required", 411)
+    if int(declared_size) > settings.EDIT_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+        return error_response(f"Image exceeds {settings.EDIT_MAX_UPLOAD_BYTES} bytes", 413)
+
+    form = await request.form(max_files=1, max_fields=1)
+    try:
+        prompt, image = form.get("prompt"), form.get("image")
+        if not isinstance(prompt, str) or not isinstance(image, StarletteUploadFile):
+            return error_response("Form fields 'prompt' and 'image' are required", 422)
+        if image.size is None:
+            return error_response("Upload size unknown", 411)
+        return await _edit_from_file(request, prompt, image.file, image.size, EDIT_PREPROCESS)
+    finally:
+        await form.close()
+
+
+@router.post("/edit-image/raw")
+@limiter.limit("3/minute")
+async def edit_image_raw_endpoint(request: Request, prompt: str):
+    """Raw image body (Content-Type: image/*) with the prompt as a query parameter."""
+    if not request.headers.get("content-type", "").startswith("image/"):
+        return error_response("Content-Type must be image/*", 415)
+    declared_size = request.headers.get("content-length")
+    if declared_size and declared_size.isdigit() and int(declared_size) > settings.EDIT_MAX_UPLOAD_BYTES:
+        return error_response(f"Image exceeds {settings.EDIT_MAX_UPLOAD_BYTES} bytes", 413)
+
+    with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES) as spool:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > settings.EDIT_MAX_UPLOAD_BYTES:
+                return error_response(f"Image exceeds {settings.EDIT_MAX_UPLOAD_BYTES} bytes", 413)
+            spool.write(chunk)
+        spool.seek(0)
+        return await _edit_from_file(request, prompt, spool, size, EDIT_PREPROCESS)
@@ -0,0 +1,93 @@
+import json
+import asyncio
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from schemas.image_schema import ImageRequest, JobResponse
+from services.gemini_service import extract_image_count
+from services.job_service import job_manager, get_job, job_paths, JobServiceError, FINISHED_STATUSES
+from core.database import get_db, SessionLocal
+from utils.response_utils import error_response, build_image_url, quota_exceeded_response
+from core.rate_limit import limiter, charge_quota
+
+router = APIRouter(prefix="/api", tags=["Jobs"])
+
+# How long the SSE stream waits for a push before re-checking the database
+# (covers jobs picked up by another worker process) and sending a keep-alive.
+SSE_POLL_SECONDS = 10
+
+
+def _job_response(job) -> dict:
+    return JobResponse(
+        job_id=job.id,
+        status=job.status,
+        prompt=job.prompt,
+        image_urls=[build_image_url(path) for path in job_paths(job)],
+        error=job.error,
+    ).model_dump()
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/jobs")
+@limiter.limit("5/minute")
+async def submit_job_endpoint(payload: ImageRequest, request: Request):
+    """Queue a (possibly multi-image) generation and return immediately with a job id."""
+    retry_after = await charge_quota(request, extract_image_count(payload.prompt))
+    if retry_after:
+        return quota_exceeded_response(retry_after)
+    try:
+        job_id = await job_manager.submit(payload.prompt)
+    except JobServiceError as e:
+        return error_response(e.message, 503 if e.error_type == "QueueFull" else 400)
+    return JSONResponse(
+        status_code=202,
+        content={"status": True, "message": "Job queued", "job_id": job_id},
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_endpoint(job_id: str, db: AsyncSession = Depends(get_db)):
+    job = await get_job(db, job_id)
+    if not job:
+        return error_response("Job not found", 404)
+    return JSONResponse(status_code=200, content={"status": True, **_job_response(job)})
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events_endpoint(job_id: str, db: AsyncSession = Depends(get_db)):
+    """Server-Sent Events: one `image` event per finished image, then `done` or `failed`."""
+    if not await get_job(db, job_id):
+        return error_response("Job not found", 404)
+
+    async def event_stream():
+        # Subscribe before reading the snapshot so no update is missed in between.
+        # The worker commits before publishing, so each push is just a cue to re-read.
+        events = job_manager.subscribe(job_id)
+        sent = set()
+        try:
+            while True:
+                async with SessionLocal() as session:
+                    job = await get_job(session, job_id)
+                for path in job_paths(job):
+                    if path not in sent:
+                        sent.add(path)
+                        yield _sse("image", {"image_url": build_image_url(path)})
+                if job.status in FINISHED_STATUSES:
+                    yield _sse(job.status, {"job_id": job_id, "error": job.error})
+                    return
+
+                try:
+                    await asyncio.wait_for(events.get(), timeout=SSE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            job_manager.unsubscribe(job_id, events)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,149 @@
+import os
+import stat
+import hashlib
+import asyncio
+from collections import OrderedDict
+from fastapi import APIRouter, Request
+from fastapi.responses import FileResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException
+from core.config import settings
+from services.variant_service import get_variant, VariantError
+from utils.response_utils import error_response
+
+router = APIRouter(prefix="/media", tags=["Media"])
+
+# Output files are named after a digest of their bytes (storage.content_key) and
+# never change once written, so clients and CDNs may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Precompressed siblings we look for, in order of preference
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+MEDIA_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp", ".avif": "image/avif"}
+
+# (path, size, mtime_ns) -> strong ETag; bounded so it can't grow without limit
+_ETAG_CACHE_SIZE = 10_000
+_etag_cache = OrderedDict()
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+async def _strong_etag(path: str, stat_result: os.stat_result) -> str:
+    """Content-hash ETag, computed once per file version off the event loop"""
+    key = (path, stat_result.st_size, stat_result.st_mtime_ns)
+    etag = _etag_cache.get(key)
+    if etag is None:
+        etag = f'"{await asyncio.to_thread(_hash_file, path)}"'
+        _etag_cache[key] = etag
+        while len(_etag_cache) > _ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    else:
+        _etag_cache.move_to_end(key)
+    return etag
+
+
+def is_public_media_path(file_path: str) -> bool:
+    """
+    Only image files are public: hidden entries (.gc.lock, .variants/, ...) and
+    anything else kept next to the images (e.g. .ref pointers) are not.
+    """
+    parts = file_path.replace("\\", "/").split("/")
+    if any(part.startswith(".") for part in parts):
+        return False
+    return os.path.splitext(parts[-1])[1].lower() in MEDIA_TYPES
+
+
+def resolve_media_path(file_path: str):
+    """Map a URL path onto OUTPUT_DIR, refusing non-image files and anything that escapes it"""
+    if not is_public_media_path(file_path):
+        return None
+    root = os.path.realpath(settings.OUTPUT_DIR)
+    full_path = os.path.realpath(os.path.join(root, file_path))
+    if os.path.commonpath([root, full_path]) != root:
+        return None
+    return full_path
+
+
+class MediaStaticFiles(StaticFiles):
+    """StaticFiles for the legacy /static/generated_images/ mount, with the same file rules as /media"""
+
+    async def get_response(self, path: str, scope):
+        if not is_public_media_path(path):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def _media_type(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    return MEDIA_TYPES.get(extension, "application/octet-stream")
+
+
+def _pick_encoding(accepted: str, full_path: str):
+    """Return (path, encoding) for the best precompressed variant the client accepts"""
+    for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            return full_path + suffix, encoding
+    return full_path, None
+
+
+@router.get("/{file_path:path}")
+async def media_endpoint(file_path: str, request: Request, w: int | None = None, fmt: str | None = None):
+    """
+    Serves generated images from OUTPUT_DIR only.
+    Strong ETags + immutable caching, cheap 304s, Range requests, and
+    precompressed .br/.gz siblings when the client accepts them.
+    `?w=256&fmt=webp` returns a resized / re-encoded variant, rendered once and cached.
+    """
+    full_path = resolve_media_path(file_path)
+    if full_path is None or not await asyncio.to_thread(os.path.isfile, full_path):
+        return error_response("Image not found", 404)
+
+    if w is not None or fmt is not None:
+        try:
+            variant_path = await get_variant(full_path, w, fmt)
+        except VariantError as e:
+            return error_response(str(e), 400)
+        return await _serve_file(request, variant_path, None)
+
+    serve_path, encoding = await asyncio.to_thread(
+        _pick_encoding, request.headers.get("accept-encoding", ""), full_path
+    )
+    return await _serve_file(request, serve_path, encoding, media_type=_media_type(full_path))
+
+
+async def _serve_file(request: Request, serve_path: str, encoding: str | None, media_type: str = None):
+    try:
+        stat_result = await asyncio.to_thread(os.stat, serve_path)
+    except FileNotFoundError:
+        return error_response("Image not found", 404)
+    if not stat.S_ISREG(stat_result.st_mode):
+        return error_response("Image not found", 404)
+
+    etag = await _strong_etag(serve_path, stat_result)
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag, "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    # FileResponse handles Range/If-Range and uses the server's zero-copy
+    # pathsend extension when available.
+    return FileResponse(
+        serve_path, headers=headers, stat_result=stat_result, media_type=media_type or _media_type(serve_path)
+    )
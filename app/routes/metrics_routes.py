@@ -0,0 +1,42 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from core.database import get_pool_stats
+from core.metrics import registry, COMPONENT_STATS
+from services import gemini_service
+from services.image_cache import image_cache
+from services.edit_cache import edit_cache
+from services.log_writer import log_writer
+from services.job_service import job_manager
+from services.storage_gc import storage_gc
+
+router = APIRouter(tags=["Metrics"])
+
+
+@registry.add_collector
+def _collect_component_stats():
+    """Copy counters kept by the services into gauges at scrape time"""
+    components = {
+        "single_flight": gemini_service.single_flight.stats(),
+        "image_cache": image_cache.stats(),
+        "edit_cache": edit_cache.stats(),
+        "log_writer": log_writer.stats(),
+        "storage_gc": storage_gc.stats(),
+        "db_pool": get_pool_stats(),
+        "preprocess": gemini_service.preprocess_totals,
+        "hedging": gemini_service.hedger.stats(),
+        "job_queue": {"queued": job_manager.queue.qsize() if job_manager.queue else 0},
+        "circuit_breaker": {
+            "open": int(gemini_service.circuit_breaker.state != "closed"),
+            "consecutive_failures": gemini_service.circuit_breaker.failures,
+        },
+    }
+    for component, stats in components.items():
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)):
+                COMPONENT_STATS.set(value, component=component, stat=stat)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text exposition format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class ImageRequest(BaseModel):
     prompt: str
@@ -10,4 +10,19 @@ class ImageEditRequest(BaseModel):
 class ImageResponse(BaseModel):
     status: bool
     message: str
-    image_url: str | None = None
\ No newline at end of file
+    image_url: str | None = None
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    prompt: str
+    image_urls: list[str] = []
+    error: str | None = None
+
+class BatchItem(BaseModel):
+    prompt: str
+    count: int | None = Field(default=None, ge=1, le=10)  # overrides the count detected from the prompt
+    id: str | None = None  # echoed back so callers can match results
+
+class BatchRequest(BaseModel):
+    items: list[BatchItem] = Field(min_length=1)
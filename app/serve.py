@@ -0,0 +1,68 @@
+"""
+Production entry point: prepares the database once, then runs N uvicorn workers.
+
+    cd app
+    python serve.py --workers 4 --port 9000
+
+Workers skip the startup `create_all` (DB_CREATE_TABLES=false) and build the
+Gemini client on first use. With more than one worker, logs go to stdout
+(LOG_TARGET) for the process manager to collect. On SIGTERM uvicorn stops accepting connections,
+waits up to SHUTDOWN_GRACE_SECONDS for open requests, and each worker then
+drains its running jobs before exiting.
+"""
+import os
+import asyncio
+import argparse
+import uvicorn
+from core.config import settings
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Gemini Image API with multiple workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "9000")))
+    parser.add_argument("--workers", type=int, default=settings.WEB_CONCURRENCY or os.cpu_count() or 1)
+    parser.add_argument("--skip-migrate", action="store_true", help="don't create missing tables before starting")
+    return parser.parse_args(argv)
+
+
+async def prepare_database():
+    # Import the models so their tables are registered on Base.metadata
+    from core.database import create_tables, engine
+    from models import image_log, error_log, job, edit_result  # noqa: F401
+    from services.history_service import backfill_prompt_digests
+
+    try:
+        await create_tables()
+        await backfill_prompt_digests()
+    finally:
+        await engine.dispose()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.workers > 1 and "LOG_TARGET" not in os.environ:
+        # RotatingFileHandler isn't multi-process safe: workers would rotate
+        # logs/app.log under each other. Inherited by the workers.
+        os.environ["LOG_TARGET"] = settings.LOG_TARGET = "stdout"
+    if not args.skip_migrate:
+        asyncio.run(prepare_database())
+        print("✅ Database and tables initialized successfully")
+
+    # Inherited by the worker processes
+    os.environ["DB_CREATE_TABLES"] = "false"
+
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=int(settings.SHUTDOWN_GRACE_SECONDS),
+        # main.py writes its own sampled access log
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
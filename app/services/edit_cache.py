@@ -0,0 +1,127 @@
+import io
+import time
+from datetime import datetime
+import numpy as np
+from PIL import Image, ImageOps
+from sqlalchemy import select
+from core.config import settings
+from core.database import SessionLocal
+from core.logger import logger
+from models.edit_result import EditResult
+from services.image_cache import cache_key
+from services.image_processing import run_in_encode_pool
+from services.log_writer import log_writer
+from services.storage import storage
+
+HASH_SIZE = 8     # 8x8 low-frequency DCT block -> 64-bit hash
+SAMPLE_SIZE = 32  # image is reduced to 32x32 grey before the DCT
+
+# Orthogonal DCT-II basis, so the 2D transform is two matrix products
+_n = np.arange(SAMPLE_SIZE)
+_DCT = np.cos(np.pi * (2 * _n[None, :] + 1) * _n[:, None] / (2 * SAMPLE_SIZE)).astype(np.float32)
+
+# Candidates compared per lookup (newest first)
+MAX_CANDIDATES = 500
+
+
+# ✅ Runs in the encode pool (module-level so it can be pickled to a process)
+def perceptual_hash(data: bytes) -> int:
+    """
+    64-bit DCT perceptual hash. Survives re-encoding, resizing and mild
+    colour changes; visually different images differ in many bits.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        if source.format == "JPEG":
+            source.draft("L", (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+        image = ImageOps.exif_transpose(source).convert("L")
+        image = image.resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    pixels = np.asarray(image, dtype=np.float32)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    bits = low > np.median(low[1:])  # DC term excluded from the median
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _to_signed(value: int) -> int:
+    # BIGINT columns are signed; keep the same 64 bits
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming_distances(hashes: list, value: int) -> np.ndarray:
+    stored = np.asarray(hashes, dtype=np.int64).view(np.uint64)
+    return np.bitwise_count(stored ^ np.uint64(value))
+
+
+class EditCache:
+    """
+    Index of (input phash, prompt) -> stored edit result, kept in the
+    `edit_results` table so every worker shares it and it survives restarts.
+    A lookup loads the recent results for the prompt and picks the closest
+    input within `max_distance` bits; the stored file is checked before it
+    is returned. Entries older than `ttl_seconds` are ignored (the storage GC
+    removes them).
+    """
+
+    def __init__(self, storage, max_distance: int, ttl_seconds: int):
+        self.storage = storage
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def prompt_digest(prompt: str) -> str:
+        return cache_key(settings.GEMINI_MODEL, prompt.strip())
+
+    async def hash_input(self, data: bytes):
+        """Perceptual hash of the input, or None if it can't be decoded"""
+        try:
+            return await run_in_encode_pool(perceptual_hash, data)
+        except Exception as e:
+            logger.error(f"Perceptual hash failed, skipping edit cache: {e}")
+            return None
+
+    async def lookup(self, prompt: str, phash: int):
+        """Storage key of a previous result for a near-identical input, or None"""
+        started = time.perf_counter()
+        query = (
+            select(EditResult.phash, EditResult.image_path)
+            .where(EditResult.prompt_digest == self.prompt_digest(prompt))
+            .order_by(EditResult.id.desc())
+            .limit(MAX_CANDIDATES)
+        )
+        if self.ttl_seconds:
+            query = query.where(EditResult.created_at >= datetime.utcfromtimestamp(time.time() - self.ttl_seconds))
+        try:
+            async with SessionLocal() as db:
+                rows = (await db.execute(query)).all()
+        except Exception as e:
+            logger.error(f"Edit cache lookup failed: {e}")
+            return None
+
+        if rows:
+            distances = hamming_distances([row.phash for row in rows], phash)
+            best = int(distances.argmin())
+            if distances[best] <= self.max_distance and await self.storage.stat(rows[best].image_path):
+                self.hits += 1
+                logger.info(
+                    f"Edit cache hit (distance {int(distances[best])}) in "
+                    f"{(time.perf_counter() - started) * 1000:.1f} ms"
+                )
+                return rows[best].image_path
+        self.misses += 1
+        return None
+
+    def add(self, prompt: str, phash: int, storage_key: str):
+        log_writer.add(
+            EditResult, prompt_digest=self.prompt_digest(prompt), phash=_to_signed(phash), image_path=storage_key
+        )
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+edit_cache = EditCache(
+    storage,
+    max_distance=settings.EDIT_CACHE_MAX_DISTANCE,
+    ttl_seconds=settings.IMAGE_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,90 @@
+import io
+import asyncio
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from core.config import settings
+
+
+# ✅ Backend that uses the SDK's native async client (client.aio)
+class AsyncClientBackend:
+    """Awaits `client.aio.models.generate_content` without blocking the event loop"""
+
+    name = "async"
+    uses_client = True
+
+    async def generate_content(self, client, **kwargs):
+        return await client.aio.models.generate_content(**kwargs)
+
+    def shutdown(self):
+        pass
+
+
+# ✅ Backend that runs the sync SDK in a bounded thread pool
+class ThreadPoolBackend:
+    """Runs `client.models.generate_content` on a dedicated executor"""
+
+    name = "thread"
+    uses_client = True
+
+    def __init__(self, max_workers: int = None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.GEMINI_MAX_CONCURRENCY,
+            thread_name_prefix="gemini",
+        )
+
+    async def generate_content(self, client, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, lambda: client.models.generate_content(**kwargs)
+        )
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ✅ Local stand-in for Gemini, used for offline runs and concurrency checks
+class FakeBackend:
+    """
+    Sleeps for `latency` seconds and returns a response shaped like the SDK's,
+    carrying a solid-colour PNG as inline data. The client argument is ignored.
+    """
+
+    name = "fake"
+    uses_client = False  # no genai.Client (or GOOGLE_API_KEY) needed
+
+    def __init__(self, latency: float = None, image_size: int = 64):
+        self.latency = settings.GEMINI_FAKE_LATENCY if latency is None else latency
+        self.image_size = image_size
+        self.calls = 0
+
+    def _png_bytes(self, call: int) -> bytes:
+        # A distinct colour per call, so every fake image gets its own content key
+        buffer = io.BytesIO()
+        Image.new("RGB", (self.image_size, self.image_size), (call * 37 % 256, call // 256 % 256, 200)).save(buffer, "PNG")
+        return buffer.getvalue()
+
+    async def generate_content(self, client, **kwargs):
+        self.calls += 1
+        call = self.calls  # taken before the sleep; concurrent calls would all see the last count
+        await asyncio.sleep(self.latency)
+        part = SimpleNamespace(text=None, inline_data=SimpleNamespace(mime_type="image/png", data=self._png_bytes(call)))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+    def shutdown(self):
+        pass
+
+
+BACKENDS = {
+    "async": AsyncClientBackend,
+    "thread": ThreadPoolBackend,
+    "fake": FakeBackend,
+}
+
+
+def create_backend(name: str = None):
+    """Build the backend named in settings (or `name`)"""
+    name = (name or settings.GEMINI_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown Gemini backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]()
@@ -1,14 +1,53 @@
 import io
 import re
 import base64
+import time
 import asyncio
+import inspect
+import itertools
+import hashlib
 from PIL import Image, UnidentifiedImageError
 from google import genai
+from google.genai import types
 from google.api_core import exceptions as google_exceptions
 from core.config import settings
 from core.logger import logger
+from core.metrics import STAGE_SECONDS, GEMINI_IN_FLIGHT
+from services.gemini_backends import create_backend
+from services.image_cache import image_cache, cache_key
+from services.single_flight import SingleFlight
+from services.image_processing import ensure_png, run_in_encode_pool
+from services.storage import storage, content_key
+from services.edit_cache import edit_cache
+from services.image_preprocess import PreprocessOptions, preprocess_image
+from services.resilience import (
+    circuit_breaker, rate_limiter, CircuitOpenError, LatencyTracker, Hedger,
+    is_retryable, is_api_response, is_quota_error, retry_after_seconds, backoff_delay,
+)
 
-client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+# Built on first use, so importing this module (once per worker) stays cheap.
+# Assign a client here to swap it out (e.g. benchmarks/stub_client.py).
+client = None
+
+# Pluggable model backend + global cap on concurrent Gemini calls
+backend = create_backend()
+_gemini_semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+
+# Recent Gemini call latencies drive the hedging delay
+latency_tracker = LatencyTracker()
+hedger = Hedger(
+    latency_tracker,
+    percentile=settings.GEMINI_HEDGE_PERCENTILE,
+    budget=settings.GEMINI_HEDGE_BUDGET,
+    min_delay=settings.GEMINI_HEDGE_MIN_DELAY,
+)
+
+# Coalesces concurrent identical generate/edit requests into one Gemini call
+single_flight = SingleFlight()
+
+# Default input normalisation for edits; routes may pass their own PreprocessOptions
+DEFAULT_PREPROCESS = PreprocessOptions.from_settings()
+preprocess_totals = {"images": 0, "bytes_saved": 0, "seconds": 0.0}
 
 class GeminiServiceError(Exception):
     def __init__(self, message: str, error_type: str = "GeneralError"):
@@ -18,17 +57,101 @@ class GeminiServiceError(Exception):
 
 
 # ✅ Reusable retry-safe Gemini API call
-async def safe_api_call(func, *args, retries=3, delay=1, **kwargs):
-    """Retry wrapper for Gemini API calls"""
+async def safe_api_call(func, *args, retries=None, delay=None, **kwargs):
+    """
+    Retry wrapper for Gemini API calls.
+
+    Every attempt passes the shared circuit breaker and takes a token from the
+    global bucket, so concurrent tasks back off together instead of hammering
+    the API. Retryable failures sleep with jittered exponential backoff,
+    honouring any retry-after hint from the server.
+    """
+    retries = retries or settings.GEMINI_RETRIES
+    delay = delay or settings.GEMINI_RETRY_BASE_DELAY
     for attempt in range(retries):
         try:
-            return func(*args, **kwargs)
-        except google_exceptions.ServiceUnavailable:
-            if attempt < retries - 1:
-                await asyncio.sleep(delay)
-                delay *= 2
-            else:
+            circuit_breaker.before_call()
+        except CircuitOpenError:
+            raise GeminiServiceError("Gemini API temporarily unavailable, try again later", "CircuitOpen")
+        await rate_limiter.acquire()
+
+        try:
+            result = func(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+        except asyncio.CancelledError:
+            circuit_breaker.release()
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                if is_api_response(e):
+                    # Upstream answered (e.g. bad request / permission) — it is healthy
+                    circuit_breaker.record_success()
+                else:
+                    # Our own bug, not an upstream signal either way
+                    circuit_breaker.release()
+                raise
+            circuit_breaker.record_failure()
+            if attempt == retries - 1:
+                if is_quota_error(e):
+                    raise GeminiServiceError("Gemini API quota or credits exhausted", "ResourceExhausted")
                 raise GeminiServiceError("Gemini API service unavailable", "ServiceUnavailable")
+            wait = backoff_delay(attempt, delay, settings.GEMINI_RETRY_MAX_DELAY, retry_after_seconds(e))
+            logger.info(f"Gemini call failed ({type(e).__name__}), retry {attempt + 1}/{retries - 1} in {wait:.2f}s")
+            await asyncio.sleep(wait)
+        else:
+            circuit_breaker.record_success()
+            return result
+
+
+def get_client():
+    global client
+    if client is None:
+        client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+    return client
+
+
+# ✅ Swap the model backend (e.g. a FakeBackend for local runs)
+def set_backend(new_backend, max_concurrency: int = None):
+    """Replace the active backend and optionally resize the concurrency cap"""
+    global backend, _gemini_semaphore
+    backend.shutdown()
+    backend = new_backend
+    if max_concurrency is not None:
+        _gemini_semaphore = asyncio.Semaphore(max_concurrency)
+
+
+async def _call_backend(contents: list, model: str = None):
+    """Run one generate_content call through the active backend, bounded by the semaphore"""
+    async with _gemini_semaphore:
+        started = time.perf_counter()
+        try:
+            with GEMINI_IN_FLIGHT.track_inprogress(), STAGE_SECONDS.time(stage="api_call"):
+                return await backend.generate_content(
+                    get_client() if getattr(backend, "uses_client", True) else None,
+                    model=model or settings.GEMINI_MODEL,
+                    contents=contents,
+                )
+        finally:
+            # Failed and cancelled calls count too: a primary cancelled after losing to its
+            # backup took at least this long, and leaving it out would pull the hedge delay down
+            latency_tracker.record(time.perf_counter() - started)
+
+
+async def _before_backup() -> bool:
+    # A backup only helps if it can start right away; under load it would just queue
+    if _gemini_semaphore.locked():
+        return False
+    await rate_limiter.acquire()
+    return True
+
+
+# ✅ Single entry point for model calls — never blocks the event loop
+async def _call_gemini(contents: list, model: str = None):
+    """One Gemini call, hedged with a backup request when GEMINI_HEDGE_ENABLED"""
+    if settings.GEMINI_HEDGE_ENABLED:
+        return await hedger.run(_call_backend, contents, model, before_backup=_before_backup)
+    return await _call_backend(contents, model)
 
 
 # ✅ Helper: Extract number of images from prompt
@@ -46,27 +169,32 @@ def extract_image_count(prompt: str) -> int:
 
 # ✅ Core single-image generator
 async def _generate_single_image(prompt: str, index: int = None) -> str:
-    """Generate a single image safely from Gemini"""
+    """Generate a single image safely from Gemini (served from the result cache when possible)"""
+    key = cache_key(settings.GEMINI_MODEL, prompt, index or 0)
+    if settings.IMAGE_CACHE_ENABLED:
+        cached_path = await image_cache.get(key)
+        if cached_path:
+            logger.info(f"Image cache hit for prompt: '{prompt}'")
+            return cached_path
+
     try:
-        response = await safe_api_call(
-            client.models.generate_content,
-            model="gemini-2.5-flash-image",
-            contents=[prompt]
-        )
+        response = await safe_api_call(_call_gemini, contents=[prompt])
 
         if not response or not response.candidates:
             raise GeminiServiceError("No response from Gemini API", "EmptyResponse")
 
         for part in response.candidates[0].content.parts:
             if part.inline_data:
-                image = Image.open(io.BytesIO(part.inline_data.data))
-                filename_suffix = f"_{index}" if index is not None else ""
-                output_path = f"generated_images/generated_{abs(hash(prompt))}{filename_suffix}.png"
-                image.save(output_path)
+                data = await ensure_png(part.inline_data.data)
+                output_path = await storage.put(content_key("generated_", data), data)
+                if settings.IMAGE_CACHE_ENABLED:
+                    await image_cache.put(key, output_path)
                 return output_path
 
         raise GeminiServiceError("Gemini API did not return image data", "NoImageData")
 
+    except GeminiServiceError:
+        raise
     except google_exceptions.PermissionDenied:
         raise GeminiServiceError("Gemini API key invalid or missing permission", "PermissionDenied")
     except google_exceptions.ResourceExhausted:
@@ -78,8 +206,21 @@ async def _generate_single_image(prompt: str, index: int = None) -> str:
         raise GeminiServiceError(str(e), "UnknownError")
 
 
+# ✅ Helper: per-image prompts for a multi-image request
+def _variant_prompts(prompt: str, image_count: int):
+    """Slightly modify prompt for better diversity; returns (prompt, index) pairs"""
+    return [(f"{prompt} (version {i+1})", i + 1) for i in range(image_count)]
+
+
 # ✅ Main function — handles both single and multi-image prompts
 async def generate_image(prompt: str):
+    """Generate image(s) for a prompt; identical concurrent prompts share one call"""
+    key = ("generate", settings.GEMINI_MODEL, prompt)
+    paths = await single_flight.do(key, _generate_images, prompt)
+    return list(paths)
+
+
+async def _generate_images(prompt: str):
     try:
         if not prompt.strip():
             raise GeminiServiceError("Prompt cannot be empty", "ValidationError")
@@ -90,10 +231,9 @@ async def generate_image(prompt: str):
 
         # Generate multiple images asynchronously if requested
         if image_count > 1:
-            # Slightly modify prompt for better diversity
             tasks = [
-                _generate_single_image(f"{prompt} (version {i+1})", index=i+1)
-                for i in range(image_count)
+                _generate_single_image(variant_prompt, index=index)
+                for variant_prompt, index in _variant_prompts(prompt, image_count)
             ]
             results = await asyncio.gather(*tasks, return_exceptions=True)
 
@@ -120,42 +260,212 @@ async def generate_image(prompt: str):
         raise GeminiServiceError(str(e), "UnknownError")
 
 
-# ✅ Image editing (unchanged, except for naming consistency)
-async def edit_image(prompt: str, base64_image: str) -> str:
+# ✅ Streaming variant — yields each image path as soon as it is ready
+async def iter_generated_images(prompt: str):
+    """Async generator used by background jobs to report images one by one"""
+    if not prompt.strip():
+        raise GeminiServiceError("Prompt cannot be empty", "ValidationError")
+
+    image_count = extract_image_count(prompt)
+    if image_count == 1:
+        yield await _generate_single_image(prompt)
+        return
+
+    tasks = [
+        asyncio.ensure_future(_generate_single_image(variant_prompt, index=index))
+        for variant_prompt, index in _variant_prompts(prompt, image_count)
+    ]
+    produced = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                path = await next_done
+            except GeminiServiceError as e:
+                logger.error(f"Streamed image failed: {e}")
+                continue
+            produced += 1
+            yield path
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if not produced:
+        raise GeminiServiceError("No images generated successfully", "EmptyResponse")
+
+
+# ✅ Batch variant — many prompts share the Gemini budget fairly
+async def iter_batch_results(items: list, max_in_flight: int = None):
+    """
+    Async generator over (item_index, paths, error) for a list of
+    (prompt, count) pairs, yielded as each prompt finishes.
+
+    Images are started round-robin across prompts (every prompt's first image
+    before any second image), and at most `max_in_flight` of them wait on the
+    shared semaphore at once, so a large batch can't starve other requests.
+    """
+    max_in_flight = max_in_flight or max(1, settings.GEMINI_MAX_CONCURRENCY // 2)
+    window = asyncio.Semaphore(max_in_flight)
+    finished = asyncio.Queue()
+
+    per_item = []
+    for item_index, (prompt, count) in enumerate(items):
+        if not prompt.strip():
+            per_item.append([])
+            continue
+        count = count or extract_image_count(prompt)
+        per_item.append(_variant_prompts(prompt, count) if count > 1 else [(prompt, None)])
+
+    slots = [[None] * len(images) for images in per_item]
+    remaining = [len(images) for images in per_item]
+    errors = [None] * len(per_item)
+
+    async def run_one(item_index: int, slot: int, prompt: str, index: int):
+        try:
+            key = ("generate_single", settings.GEMINI_MODEL, prompt, index)
+            path = await single_flight.do(key, _generate_single_image, prompt, index)
+            finished.put_nowait((item_index, slot, path, None))
+        except GeminiServiceError as e:
+            finished.put_nowait((item_index, slot, None, e))
+        except Exception as e:
+            finished.put_nowait((item_index, slot, None, GeminiServiceError(str(e), "UnknownError")))
+        finally:
+            window.release()
+
+    tasks = []
+
+    async def feed():
+        for round_ in itertools.zip_longest(*(enumerate(images) for images in per_item)):
+            for item_index, entry in enumerate(round_):
+                if entry is None:
+                    continue
+                slot, (prompt, index) = entry
+                await window.acquire()
+                tasks.append(asyncio.create_task(run_one(item_index, slot, prompt, index)))
+
+    feeder = asyncio.create_task(feed())
+    try:
+        for item_index, images in enumerate(per_item):
+            if not images:
+                yield item_index, [], GeminiServiceError("Prompt cannot be empty", "ValidationError")
+
+        for _ in range(sum(remaining)):
+            item_index, slot, path, error = await finished.get()
+            slots[item_index][slot] = path
+            errors[item_index] = error or errors[item_index]
+            remaining[item_index] -= 1
+            if remaining[item_index]:
+                continue
+            paths = [path for path in slots[item_index] if path]
+            if paths:
+                yield item_index, paths, None
+            elif len(slots[item_index]) > 1:
+                yield item_index, [], GeminiServiceError("No images generated successfully", "EmptyResponse")
+            else:
+                yield item_index, [], errors[item_index]
+    finally:
+        feeder.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+# ✅ Cheap upload validation — reads only the image header, never the pixels
+def validate_image_header(fileobj, size: int) -> str:
+    """Check byte size and pixel dimensions before any full decode; returns the image format"""
+    if size > settings.EDIT_MAX_UPLOAD_BYTES:
+        raise GeminiServiceError(f"Image exceeds {settings.EDIT_MAX_UPLOAD_BYTES} bytes", "PayloadTooLarge")
+    try:
+        with Image.open(fileobj) as image:
+            image_format = image.format
+            width, height = image.size
+    except Exception:
+        raise GeminiServiceError("Invalid image data", "InvalidInput")
+    finally:
+        fileobj.seek(0)
+    if width * height > settings.EDIT_MAX_PIXELS:
+        raise GeminiServiceError(f"Image exceeds {settings.EDIT_MAX_PIXELS} pixels", "PayloadTooLarge")
+    return image_format
+
+
+# ✅ Image editing from a base64 (optionally data-URL) string
+async def edit_image(prompt: str, base64_image: str, preprocess: PreprocessOptions = None) -> str:
+    if not base64_image:
+        raise GeminiServiceError("Base64 image required", "InvalidInput")
+    try:
+        # Skip a "data:image/...;base64," prefix without copying the whole string twice
+        payload_start = base64_image.find(",", 0, 100) + 1
+        image_data = base64.b64decode(base64_image[payload_start:] if payload_start else base64_image)
+    except Exception:
+        raise GeminiServiceError("Invalid base64 image data", "InvalidInput")
+    return await edit_image_bytes(prompt, image_data, preprocess)
+
+
+# ✅ Image editing from raw bytes — identical concurrent edits share one call
+async def edit_image_bytes(prompt: str, image_data: bytes, preprocess: PreprocessOptions = None) -> str:
+    preprocess = preprocess or DEFAULT_PREPROCESS
+    image_digest = hashlib.sha256(image_data).hexdigest()
+    key = ("edit", settings.GEMINI_MODEL, prompt, image_digest, preprocess)
+    return await single_flight.do(key, _edit_image, prompt, image_data, preprocess)
+
+
+# ✅ Shrink/normalise the input before upload (runs on the encode pool)
+async def _prepare_input(image_data: bytes, image_format: str, preprocess: PreprocessOptions):
+    """Returns (bytes, mime_type) to send to Gemini"""
+    if not preprocess.enabled:
+        return image_data, Image.MIME.get(image_format, "image/png")
+
+    data, mime_type, stats = await run_in_encode_pool(preprocess_image, image_data, preprocess)
+    preprocess_totals["images"] += 1
+    preprocess_totals["bytes_saved"] += stats["bytes_saved"]
+    preprocess_totals["seconds"] += stats["elapsed_ms"] / 1000
+    STAGE_SECONDS.observe(stats["elapsed_ms"] / 1000, stage="preprocess")
+    logger.info(
+        f"Preprocessed input {stats['original_size']} -> {stats['output_size']}, "
+        f"{stats['original_bytes']} -> {stats['output_bytes']} bytes "
+        f"(saved {stats['bytes_saved']}) in {stats['elapsed_ms']} ms"
+    )
+    return data, mime_type
+
+
+async def _edit_image(prompt: str, image_data: bytes, preprocess: PreprocessOptions) -> str:
     try:
         if not prompt.strip():
             raise GeminiServiceError("Prompt cannot be empty", "ValidationError")
-        if not base64_image:
-            raise GeminiServiceError("Base64 image required", "InvalidInput")
 
-        try:
-            image_data = base64.b64decode(base64_image.split(",")[-1])
-            input_image = Image.open(io.BytesIO(image_data))
-        except Exception:
-            raise GeminiServiceError("Invalid base64 image data", "InvalidInput")
+        # Header-only parse to validate size limits before any full decode
+        image_format = validate_image_header(io.BytesIO(image_data), len(image_data))
+
+        # Same prompt on a near-identical input (re-encoded, resized) -> reuse the stored result
+        phash = await edit_cache.hash_input(image_data) if settings.EDIT_CACHE_ENABLED else None
+        if phash is not None:
+            cached_path = await edit_cache.lookup(prompt, phash)
+            if cached_path:
+                return cached_path
 
-        response = await safe_api_call(
-            client.models.generate_content,
-            model="gemini-2.5-flash-image",
-            contents=[prompt, input_image]
-        )
+        input_data, mime_type = await _prepare_input(image_data, image_format, preprocess)
+        input_part = types.Part.from_bytes(data=input_data, mime_type=mime_type)
+        response = await safe_api_call(_call_gemini, contents=[prompt, input_part])
 
         if not response or not response.candidates:
             raise GeminiServiceError("No response from Gemini API", "EmptyResponse")
 
         for part in response.candidates[0].content.parts:
             if part.inline_data:
-                edited_img = Image.open(io.BytesIO(part.inline_data.data))
-                output_path = f"generated_images/edited_{abs(hash(prompt))}.png"
-                edited_img.save(output_path)
+                data = await ensure_png(part.inline_data.data)
+                output_path = await storage.put(content_key("edited_", data), data)
+                if phash is not None:
+                    edit_cache.add(prompt, phash, output_path)
                 return output_path
 
         raise GeminiServiceError("Gemini API did not return edited image", "NoImageData")
 
+    except GeminiServiceError:
+        raise
     except google_exceptions.ResourceExhausted:
         raise GeminiServiceError("Gemini API quota or credits exhausted", "ResourceExhausted")
     except google_exceptions.PermissionDenied:
         raise GeminiServiceError("Invalid Gemini API key", "PermissionDenied")
+    except UnidentifiedImageError:
+        raise GeminiServiceError("Invalid image data returned from Gemini API", "InvalidImage")
     except Exception as e:
         logger.error(f"Edit error: {e}")
         raise GeminiServiceError(str(e), "UnknownError")
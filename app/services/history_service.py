@@ -0,0 +1,84 @@
+import base64
+from datetime import datetime, timezone
+from sqlalchemy import select, update, and_, or_, literal, String
+from core.database import SessionLocal, engine
+from core.logger import logger
+from models.image_log import ImageLog, digest_prompt
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque page cursor: position of the last row returned"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def _bind_time(value: datetime):
+    # created_at is stored as naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    if engine.dialect.name == "sqlite" and not value.microsecond:
+        # SQLite keeps server-default timestamps as CURRENT_TIMESTAMP text, without
+        # the fraction SQLAlchemy would add, so compare against the same text
+        return literal(value.strftime("%Y-%m-%d %H:%M:%S"), String)
+    return value
+
+
+def history_query(type_: str = None, prompt: str = None, since: datetime = None, until: datetime = None,
+                  cursor: str = None, limit: int = 100):
+    """
+    One page of ImageLog rows, newest first, plus one extra row that only tells
+    the caller whether another page exists. Keyset pagination on
+    (created_at, id) keeps every page an index range scan, however deep.
+    """
+    query = select(ImageLog.id, ImageLog.prompt, ImageLog.image_path, ImageLog.type, ImageLog.created_at)
+    if type_:
+        query = query.where(ImageLog.type == type_)
+    if prompt:
+        query = query.where(ImageLog.prompt_digest == digest_prompt(prompt))
+    if since:
+        query = query.where(ImageLog.created_at >= _bind_time(since))
+    if until:
+        query = query.where(ImageLog.created_at < _bind_time(until))
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        created_at = _bind_time(created_at)
+        query = query.where(or_(
+            ImageLog.created_at < created_at,
+            and_(ImageLog.created_at == created_at, ImageLog.id < row_id),
+        ))
+    return query.order_by(ImageLog.created_at.desc(), ImageLog.id.desc()).limit(limit + 1)
+
+
+async def backfill_prompt_digests(batch_size: int = 1000) -> int:
+    """Fill prompt_digest for rows written before the column existed"""
+    filled = 0
+    while True:
+        async with SessionLocal() as db:
+            rows = (await db.execute(
+                select(ImageLog.id, ImageLog.prompt).where(ImageLog.prompt_digest.is_(None)).limit(batch_size)
+            )).all()
+            if rows:
+                await db.execute(
+                    update(ImageLog),
+                    [{"id": row.id, "prompt_digest": digest_prompt(row.prompt)} for row in rows],
+                )
+                await db.commit()
+        filled += len(rows)
+        if len(rows) < batch_size:
+            break
+    if filled:
+        logger.info(f"Backfilled prompt_digest for {filled} ImageLog row(s)")
+    return filled
@@ -0,0 +1,110 @@
+import time
+import hashlib
+from collections import OrderedDict
+from core.config import settings
+from core.logger import logger
+from services.storage import storage, shard_key
+
+
+# ✅ Stable key for a generation request (unlike hash(), not salted per process)
+def cache_key(model: str, prompt: str, variant: int = 0) -> str:
+    digest = hashlib.sha256(f"{model}\x00{variant}\x00{prompt}".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class ImageCache:
+    """
+    Two-tier cache of generated images.
+
+    Memory tier: bounded LRU of key -> (storage key, stored_at); a hit still
+    checks that the file exists.
+    Storage tier: images are content-addressed (storage.content_key), so a
+    small `<prefix><key>.ref` object per key holds the image's storage key;
+    results are found again after a restart or by another worker, and a
+    regenerated image never overwrites an old one. Entries older than
+    `ttl_seconds` are treated as misses; removing old files is the storage
+    GC's job (services/storage_gc.py).
+    """
+
+    def __init__(self, storage, max_entries: int, ttl_seconds: int, prefix: str = "generated_"):
+        self.storage = storage
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def ref_key(self, key: str) -> str:
+        """Storage key of the pointer object for cache `key`"""
+        return shard_key(f"{self.prefix}{key}.ref")
+
+    def legacy_key(self, key: str) -> str:
+        # Before content addressing, images were stored under their cache key
+        return shard_key(f"{self.prefix}{key}.png")
+
+    def _is_fresh(self, stored_at: float) -> bool:
+        return not self.ttl_seconds or time.time() - stored_at < self.ttl_seconds
+
+    def _remember(self, key: str, storage_key: str, stored_at: float):
+        self._entries[key] = (storage_key, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str):
+        """Return the storage key cached for `key`, or None on a miss"""
+        entry = self._entries.get(key)
+        try:
+            # The storage GC (in whichever worker holds its lock) may have removed the file
+            if entry and self._is_fresh(entry[1]) and await self.storage.stat(entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            found = await self._lookup(key)
+        except Exception as e:
+            logger.error(f"Image cache lookup failed for {key}: {e}")
+            found = None
+        if found:
+            self._remember(key, *found)
+            self.hits += 1
+            return found[0]
+        self._entries.pop(key, None)
+        self.misses += 1
+        return None
+
+    async def _lookup(self, key: str):
+        """(storage key, stored_at) from the storage tier, or None"""
+        ref = self.ref_key(key)
+        ref_stat = await self.storage.stat(ref)
+        if ref_stat:
+            if not self._is_fresh(ref_stat[1]):
+                return None
+            storage_key = (await self.storage.read(ref) or b"").decode("utf-8")
+            stored_at = ref_stat[1]
+        else:
+            storage_key, stored_at = self.legacy_key(key), None
+        stat = await self.storage.stat(storage_key) if storage_key else None
+        if not stat or not self._is_fresh(stat[1]):
+            return None
+        return storage_key, stored_at or stat[1]
+
+    async def put(self, key: str, storage_key: str):
+        """Remember `storage_key` for `key` in memory and in the storage tier"""
+        self._remember(key, storage_key, time.time())
+        try:
+            await self.storage.put(
+                self.ref_key(key), storage_key.encode("utf-8"), content_type="text/plain", immutable=False
+            )
+        except Exception as e:
+            logger.error(f"Image cache failed to store pointer for {key}: {e}")
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+image_cache = ImageCache(
+    storage=storage,
+    max_entries=settings.IMAGE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.IMAGE_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,73 @@
+import io
+import time
+from dataclasses import dataclass
+from PIL import Image, ImageOps
+from core.config import settings
+
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    """How an input image is normalised before it is sent to Gemini"""
+
+    enabled: bool = True
+    max_edge: int = 1536        # longest side in pixels after downscaling
+    format: str = "JPEG"        # JPEG | WEBP | PNG (images with alpha always fall back to PNG)
+    quality: int = 85
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            enabled=settings.PREPROCESS_ENABLED,
+            max_edge=settings.PREPROCESS_MAX_EDGE,
+            format=settings.PREPROCESS_FORMAT.upper(),
+            quality=settings.PREPROCESS_QUALITY,
+        )
+
+
+# ✅ Runs in the encode pool (module-level so it can be pickled to a process)
+def preprocess_image(data: bytes, options: PreprocessOptions):
+    """
+    Downscale, re-encode and strip metadata from an input image.
+
+    JPEGs are decoded with Image.draft, so libjpeg scales by 1/2..1/8 while
+    decoding instead of materialising the full-resolution bitmap first.
+    Returns (bytes, mime_type, stats). The re-encoded copy is always used, even
+    when it is not smaller: the original may carry EXIF/GPS and other metadata.
+    """
+    started = time.perf_counter()
+    with Image.open(io.BytesIO(data)) as source:
+        original_size = source.size
+        if source.format == "JPEG":
+            source.draft("RGB", (options.max_edge, options.max_edge))
+        # Apply EXIF orientation now, since the metadata is dropped below
+        image = ImageOps.exif_transpose(source)
+
+        if max(image.size) > options.max_edge:
+            image.thumbnail((options.max_edge, options.max_edge), Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        output_format = options.format
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        if has_alpha and output_format == "JPEG":
+            output_format = "PNG"
+        if output_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        save_kwargs = {"optimize": True}
+        if output_format in ("JPEG", "WEBP"):
+            save_kwargs["quality"] = options.quality
+        image.save(buffer, output_format, **save_kwargs)
+        output = buffer.getvalue()
+        output_size = image.size
+
+    mime_type = Image.MIME[output_format]
+
+    stats = {
+        "original_bytes": len(data),
+        "output_bytes": len(output),
+        "bytes_saved": len(data) - len(output),
+        "original_size": original_size,
+        "output_size": output_size,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    return output, mime_type, stats
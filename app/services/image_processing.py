@@ -0,0 +1,82 @@
+import io
+import os
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from PIL import Image
+from core.config import settings
+from core.metrics import STAGE_SECONDS
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+_thread_pool = None
+_process_pool = None
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=settings.IMAGE_THREAD_WORKERS, thread_name_prefix="image-io")
+    return _thread_pool
+
+
+def _get_encode_pool():
+    """Process pool for CPU-bound encoding, or the thread pool when IMAGE_PROCESS_WORKERS=0"""
+    global _process_pool
+    if settings.IMAGE_PROCESS_WORKERS <= 0:
+        return _get_thread_pool()
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+    return _process_pool
+
+
+def shutdown_executors():
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+# ✅ Worker-side helpers (module-level so they can be pickled to a process pool)
+def encode_png(data: bytes) -> bytes:
+    """Decode any Pillow-readable image and re-encode it as PNG"""
+    buffer = io.BytesIO()
+    with Image.open(io.BytesIO(data)) as image:
+        image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def write_file_atomic(path: str, data: bytes):
+    """Write to a temp file and rename, so readers never see a partial image"""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+async def run_in_image_pool(func, *args):
+    """Run blocking image I/O or decoding on the image thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_thread_pool(), func, *args)
+
+
+async def run_in_encode_pool(func, *args):
+    """Run CPU-bound encoding on the encode pool (process pool when configured)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_encode_pool(), func, *args)
+
+
+# ✅ Normalise model output without blocking the event loop
+async def ensure_png(data: bytes) -> bytes:
+    """
+    PNG bytes returned by Gemini pass straight through (no decode/re-encode).
+    Other formats are re-encoded to PNG on the encode pool.
+    Raises PIL.UnidentifiedImageError for undecodable data.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        with STAGE_SECONDS.time(stage="encode"):
+            data = await run_in_encode_pool(encode_png, data)
+    return data
@@ -0,0 +1,238 @@
+import json
+import uuid
+import asyncio
+from datetime import timedelta
+from sqlalchemy import select, update, func
+from core.config import settings
+from core.database import SessionLocal
+from core.logger import logger
+from models.job import GenerationJob
+from models.image_log import ImageLog
+from services.gemini_service import iter_generated_images, GeminiServiceError
+from services.log_writer import log_writer
+from utils.error_utils import log_error
+
+FINISHED_STATUSES = ("done", "failed")
+
+
+class JobServiceError(Exception):
+    def __init__(self, message: str, error_type: str = "GeneralError"):
+        self.message = message
+        self.error_type = error_type
+        super().__init__(self.message)
+
+
+class JobManager:
+    """
+    Bounded asyncio worker pool for generation jobs.
+
+    Jobs are persisted in `generation_jobs` before they are queued, so queued
+    work survives a restart. Workers claim a job atomically (queued -> running),
+    which keeps several processes sharing one table from running it twice.
+    Each finished image is published to in-process subscribers (SSE streams).
+    Running jobs refresh `updated_at` as a lease; on startup, running jobs
+    whose lease expired (their process died) are queued again.
+    """
+
+    def __init__(self, worker_count: int, max_queue: int, lease_seconds: float):
+        self.worker_count = worker_count
+        self.max_queue = max_queue
+        self.lease_seconds = lease_seconds
+        self.queue = None
+        self.workers = []
+        self._busy = set()  # workers currently running a job
+        self._stopping = False
+        self._subscribers = {}
+
+    async def start(self):
+        self._stopping = False
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+
+        # Re-enqueue persisted jobs that never started (e.g. after a restart), and
+        # running ones whose worker stopped renewing the lease (crash, kill -9)
+        async with SessionLocal() as db:
+            # updated_at is written by the database's now() (session time zone),
+            # so the cutoff must come from the same clock
+            db_now = (await db.execute(select(func.now()))).scalar()
+            expired = await db.execute(
+                update(GenerationJob)
+                .where(
+                    GenerationJob.status == "running",
+                    GenerationJob.updated_at < db_now - timedelta(seconds=self.lease_seconds),
+                )
+                .values(status="queued")
+            )
+            await db.commit()
+            if expired.rowcount:
+                logger.warning(f"⚠️ Re-queued {expired.rowcount} job(s) with an expired lease")
+            result = await db.execute(
+                select(GenerationJob.id)
+                .where(GenerationJob.status == "queued")
+                .order_by(GenerationJob.created_at)
+                .limit(self.max_queue)
+            )
+            for job_id in result.scalars():
+                self.queue.put_nowait(job_id)
+
+        self.workers = [asyncio.create_task(self._worker(i)) for i in range(self.worker_count)]
+        logger.info(f"✅ Job workers started: {self.worker_count} (queued: {self.queue.qsize()})")
+
+    async def stop(self, timeout: float = 0):
+        """
+        Stop taking jobs and give running ones up to `timeout` seconds to finish.
+        Anything still running after that is cancelled and re-queued for the next boot.
+        """
+        self._stopping = True
+        for worker in self.workers:
+            if worker not in self._busy:
+                worker.cancel()
+        busy = list(self._busy)
+        if busy and timeout > 0:
+            logger.info(f"Draining {len(busy)} running job(s), up to {timeout:.0f}s")
+            _, pending = await asyncio.wait(busy, timeout=timeout)
+            if pending:
+                logger.warning(f"⚠️ {len(pending)} job(s) still running after drain, re-queueing")
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def submit(self, prompt: str) -> str:
+        if not prompt.strip():
+            raise JobServiceError("Prompt cannot be empty", "ValidationError")
+        if self._stopping:
+            raise JobServiceError("Server is shutting down, try again later", "QueueFull")
+        if self.queue is None or self.queue.full():
+            raise JobServiceError("Job queue is full, try again later", "QueueFull")
+
+        job_id = str(uuid.uuid4())
+        async with SessionLocal() as db:
+            db.add(GenerationJob(id=job_id, prompt=prompt, status="queued"))
+            await db.commit()
+        self.queue.put_nowait(job_id)
+        return job_id
+
+    # ---------- subscriptions (SSE) ----------
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        events = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(events)
+        return events
+
+    def unsubscribe(self, job_id: str, events: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers:
+            subscribers.discard(events)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def _publish(self, job_id: str, event: dict):
+        for events in self._subscribers.get(job_id, ()):
+            events.put_nowait(event)
+
+    # ---------- workers ----------
+
+    async def _worker(self, worker_id: int):
+        worker = asyncio.current_task()
+        while not self._stopping:
+            job_id = await self.queue.get()
+            self._busy.add(worker)
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} failed on job {job_id}: {e}")
+            finally:
+                self._busy.discard(worker)
+                self.queue.task_done()
+
+    async def _run(self, job_id: str):
+        async with SessionLocal() as db:
+            claimed = await db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.status == "queued")
+                .values(status="running")
+            )
+            await db.commit()
+            if claimed.rowcount != 1:
+                return
+
+            heartbeat = asyncio.create_task(self._renew_lease(job_id))
+            prompt = None
+            try:
+                job = await db.get(GenerationJob, job_id)
+                prompt = job.prompt
+                paths = []
+                try:
+                    async for path in iter_generated_images(prompt):
+                        paths.append(path)
+                        job.image_paths = json.dumps(paths)
+                        await db.commit()
+                        log_writer.add(ImageLog, prompt=prompt, image_path=path, type="generate")
+                        self._publish(job_id, {"event": "image", "path": path})
+                    job.status = "done"
+                except GeminiServiceError as e:
+                    job.status = "failed"
+                    job.error = e.message
+                    log_error("generation_job", e.error_type, e.message, prompt)
+                except asyncio.CancelledError:
+                    # Shutting down: hand the job back so the next boot resumes it
+                    job.status = "queued"
+                    await db.commit()
+                    raise
+
+                await db.commit()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # e.g. a failed commit: never leave the job "running" with SSE clients waiting on it
+                logger.error(f"Job {job_id} failed unexpectedly: {e}")
+                log_error("generation_job", "UnknownError", str(e), prompt)
+                await self._mark_failed(job_id, "Internal error while running the job")
+                self._publish(job_id, {"event": "failed", "error": "Internal error while running the job"})
+                return
+            finally:
+                heartbeat.cancel()
+
+            self._publish(job_id, {"event": job.status, "error": job.error})
+
+    async def _renew_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with SessionLocal() as db:
+                    await db.execute(
+                        update(GenerationJob)
+                        .where(GenerationJob.id == job_id, GenerationJob.status == "running")
+                        .values(updated_at=func.now())
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Could not renew lease for job {job_id}: {e}")
+
+    async def _mark_failed(self, job_id: str, message: str):
+        # Fresh session: the job's own session may be unusable after the error
+        try:
+            async with SessionLocal() as db:
+                await db.execute(
+                    update(GenerationJob).where(GenerationJob.id == job_id).values(status="failed", error=message)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Could not mark job {job_id} failed, it is retried after its lease expires: {e}")
+
+
+async def get_job(db, job_id: str):
+    return await db.get(GenerationJob, job_id)
+
+
+def job_paths(job: GenerationJob) -> list:
+    return json.loads(job.image_paths) if job.image_paths else []
+
+
+job_manager = JobManager(
+    worker_count=settings.JOB_WORKERS,
+    max_queue=settings.JOB_QUEUE_MAXSIZE,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+)
@@ -0,0 +1,132 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import insert
+from core.config import settings
+from core.database import SessionLocal
+from core.logger import logger
+from core.metrics import STAGE_SECONDS
+
+_STOP = object()
+
+
+class LogWriter:
+    """
+    Background writer for log tables (ImageLog, ErrorLog).
+
+    Requests call `add()` (or `add_many()` for a batch of rows that should land in
+    the same INSERT), which only puts rows on an asyncio queue. A single
+    task flushes rows with one bulk INSERT per table whenever `batch_size` rows
+    are waiting or `flush_interval` seconds have passed, and drains the queue
+    on shutdown. If the queue is full, rows are dropped (and counted) rather
+    than slowing requests down.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def add(self, model, **values):
+        values.setdefault("created_at", datetime.utcnow())
+        try:
+            self.queue.put_nowait((model, values))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error(f"Log writer queue full, dropped {model.__tablename__} row")
+
+    def add_many(self, model, rows: list):
+        """Queue several rows as one entry; they are always flushed in the same INSERT"""
+        if not rows:
+            return
+        now = datetime.utcnow()
+        for values in rows:
+            values.setdefault("created_at", now)
+        try:
+            self.queue.put_nowait((model, rows))
+        except asyncio.QueueFull:
+            self.dropped += len(rows)
+            logger.error(f"Log writer queue full, dropped {len(rows)} {model.__tablename__} row(s)")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10):
+        if self._task is None:
+            return
+        await self.queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Log writer did not drain within {timeout}s, {self.queue.qsize()} row(s) lost")
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            item = await self.queue.get()
+            deadline = loop.time() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+            if batch:
+                await self._flush(batch)
+
+        # Anything enqueued after the stop marker still gets written
+        leftovers = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not _STOP:
+                leftovers.append(item)
+        for i in range(0, len(leftovers), self.batch_size):
+            await self._flush(leftovers[i:i + self.batch_size])
+
+    async def _flush(self, batch: list):
+        rows_by_model = defaultdict(list)
+        for model, values in batch:
+            if isinstance(values, list):
+                rows_by_model[model].extend(values)
+            else:
+                rows_by_model[model].append(values)
+        row_count = sum(len(rows) for rows in rows_by_model.values())
+        try:
+            with STAGE_SECONDS.time(stage="db_flush"):
+                async with SessionLocal() as db:
+                    for model, rows in rows_by_model.items():
+                        await db.execute(insert(model), rows)
+                    await db.commit()
+            self.written += row_count
+        except Exception as e:
+            self.failed += row_count
+            logger.error(f"Log writer failed to flush {row_count} row(s): {e}")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+log_writer = LogWriter(
+    batch_size=settings.LOG_WRITER_BATCH_SIZE,
+    flush_interval=settings.LOG_WRITER_FLUSH_SECONDS,
+    max_queue=settings.LOG_WRITER_MAX_QUEUE,
+)
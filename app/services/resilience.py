@@ -0,0 +1,259 @@
+import re
+import time
+import random
+import asyncio
+import httpx
+from collections import deque
+from limits import RateLimitItemPerMinute
+from google.api_core import exceptions as google_exceptions
+from google.genai import errors as genai_errors
+from core.config import settings
+from core.logger import logger
+from core.rate_limit import limiter
+
+# Upstream errors worth retrying (server-side or quota), from either SDK
+RETRYABLE_GOOGLE_EXCEPTIONS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+
+# Gemini unreachable or too slow: no response came back at all. TimeoutError
+# covers asyncio.TimeoutError; both SDKs talk to the API through httpx.
+TRANSPORT_EXCEPTIONS = (httpx.TransportError, TimeoutError, ConnectionError)
+
+
+def is_api_response(exc: Exception) -> bool:
+    """True when the error carries an actual API answer (any status code)"""
+    return isinstance(exc, (genai_errors.APIError, google_exceptions.GoogleAPICallError))
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, RETRYABLE_GOOGLE_EXCEPTIONS + TRANSPORT_EXCEPTIONS):
+        return True
+    if isinstance(exc, genai_errors.ServerError):
+        return True
+    return isinstance(exc, genai_errors.ClientError) and exc.code == 429
+
+
+def is_quota_error(exc: Exception) -> bool:
+    if isinstance(exc, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return True
+    return isinstance(exc, genai_errors.APIError) and exc.code == 429
+
+
+def retry_after_seconds(exc: Exception):
+    """Server-provided retry hint: Retry-After header or a google.rpc.RetryInfo detail"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        if value and value.strip().isdigit():
+            return float(value)
+
+    details = getattr(exc, "details", None)
+    if isinstance(details, dict):
+        details = details.get("error", {}).get("details", [])
+    for detail in details or []:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        if delay:
+            match = re.match(r"([\d.]+)s", str(delay))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: float = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's retry hint"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive upstream failures.
+    While open, calls fail fast. After `reset_timeout` one probe call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            raise CircuitOpenError("Circuit open: Gemini API is failing, not calling it")
+        if state == "half_open":
+            self._probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self):
+        """Call finished without telling us anything about upstream health (e.g. cancelled)"""
+        self._probing = False
+
+
+class SharedRateLimiter:
+    """
+    Pacing for Gemini calls across every worker process: at most `per_minute`
+    calls in a sliding window counted in the shared rate-limit storage
+    (core/rate_limit.py), so N workers together stay under the account quota.
+    Within a worker, waiters queue on a lock and are served in arrival order.
+    A rate of 0 disables pacing.
+    """
+
+    def __init__(self, per_minute: int, name: str = "gemini_calls"):
+        self.item = RateLimitItemPerMinute(per_minute) if per_minute > 0 else None
+        self.name = name
+        self._lock = asyncio.Lock()
+
+    def _try_acquire(self):
+        """0 when a call may start now, otherwise seconds until the window frees a slot"""
+        strategy = limiter.limiter
+        if strategy.hit(self.item, self.name):
+            return 0
+        reset_time, _ = strategy.get_window_stats(self.item, self.name)
+        return max(0.05, reset_time - time.time())
+
+    async def acquire(self):
+        if self.item is None:
+            return
+        async with self._lock:
+            while True:
+                try:
+                    wait = await asyncio.to_thread(self._try_acquire)
+                except Exception as e:
+                    # Fail open, like the image quotas: a limiter outage shouldn't stop generation
+                    logger.warning(f"⚠️ Gemini rate limiter unavailable, not pacing: {e}")
+                    return
+                if not wait:
+                    return
+                await asyncio.sleep(wait + random.uniform(0, 0.05))
+
+
+class LatencyTracker:
+    """Durations of the last `window` calls, for percentile-based timeouts"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float):
+        """p-th percentile (0-100), or None until `min_samples` calls were seen"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class Hedger:
+    """
+    Hedged calls: if the first call hasn't finished after the tracker's
+    `percentile` latency (at least `min_delay`), a backup copy is started; the
+    first success wins and the other is cancelled. Every call earns `budget`
+    tokens (capped at `burst`) and a backup spends one, so backups stay at
+    most about `budget` of all calls.
+    """
+
+    def __init__(self, tracker: LatencyTracker, percentile: float, budget: float, min_delay: float,
+                 burst: int = 10):
+        self.tracker = tracker
+        self.percentile = percentile
+        self.budget = budget
+        self.min_delay = min_delay
+        self.burst = burst
+        self.tokens = float(burst)
+        self.calls = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def delay(self):
+        threshold = self.tracker.percentile(self.percentile)
+        return None if threshold is None else max(threshold, self.min_delay)
+
+    async def run(self, func, *args, before_backup=None):
+        """
+        Await `func(*args)`, hedged. `before_backup` (async, returns bool) can
+        veto or pace the backup, e.g. when no capacity is free.
+        """
+        self.calls += 1
+        self.tokens = min(self.burst, self.tokens + self.budget)
+        delay = self.delay()
+        if delay is None:
+            return await func(*args)
+
+        tasks = [asyncio.ensure_future(func(*args))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self.tokens >= 1:
+                # Reserve before awaiting, so concurrent calls can't all spend the same token
+                self.tokens -= 1
+                if (before_backup is None or await before_backup()) and not tasks[0].done():
+                    self.hedges += 1
+                    tasks.append(asyncio.ensure_future(func(*args)))
+                else:
+                    self.tokens = min(self.burst, self.tokens + 1)
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "wins": self.wins,
+            "hedge_rate": self.hedges / self.calls if self.calls else 0.0,
+            "delay_seconds": self.delay() or 0.0,
+        }
+
+
+circuit_breaker = CircuitBreaker(
+    failure_threshold=settings.GEMINI_BREAKER_THRESHOLD,
+    reset_timeout=settings.GEMINI_BREAKER_RESET_SECONDS,
+)
+rate_limiter = SharedRateLimiter(per_minute=settings.GEMINI_RATE_PER_MINUTE)
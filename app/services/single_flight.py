@@ -0,0 +1,37 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    In-process request coalescing.
+
+    Concurrent callers using the same key share one in-flight task and get
+    its result (or its exception). The shared task is shielded, so one
+    caller disconnecting does not cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    def _forget(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, func, *args, **kwargs):
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.deduplicated += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "deduplicated": self.deduplicated, "in_flight": len(self._inflight)}
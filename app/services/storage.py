@@ -0,0 +1,222 @@
+import os
+import asyncio
+import hashlib
+from core.config import settings
+from core.metrics import STAGE_SECONDS
+from services.image_processing import run_in_image_pool, write_file_atomic
+
+# Images are stored under content_key(), so an object never changes once written
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Precompressed siblings written next to local files (removed with them)
+SIBLING_SUFFIXES = (".br", ".gz")
+
+
+class StorageError(Exception):
+    pass
+
+
+def shard_key(name: str, depth: int = None) -> str:
+    """
+    Storage key for a file name: `ab/cd/<name>` from the name's sha256, so no
+    directory (or object prefix) ends up with more than a few hundred entries.
+    """
+    depth = settings.STORAGE_SHARD_DEPTH if depth is None else depth
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()
+    return "/".join([digest[i * 2:i * 2 + 2] for i in range(depth)] + [name])
+
+
+def content_key(prefix: str, data: bytes, extension: str = ".png") -> str:
+    """Sharded key named after a digest of the bytes: same key, same content, forever"""
+    return shard_key(f"{prefix}{hashlib.sha256(data).hexdigest()[:32]}{extension}")
+
+
+def normalize_key(path: str) -> str:
+    """Accept both storage keys and legacy `generated_images/<file>` paths from old rows"""
+    path = path.replace(os.sep, "/")
+    prefix = settings.OUTPUT_DIR.replace(os.sep, "/").rstrip("/") + "/"
+    return path[len(prefix):] if path.startswith(prefix) else path
+
+
+# ✅ Files under OUTPUT_DIR, served by /media
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def _write(self, key: str, data: bytes):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file_atomic(path, data)
+
+    async def put(self, key: str, data: bytes, content_type: str = "image/png", immutable: bool = True) -> str:
+        with STAGE_SECONDS.time(stage="write"):
+            await run_in_image_pool(self._write, key, data)
+        return key
+
+    def _read(self, key: str):
+        try:
+            with open(self.local_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def read(self, key: str):
+        """Object bytes, or None when missing (meant for small objects)"""
+        return await asyncio.to_thread(self._read, key)
+
+    async def stat(self, key: str):
+        """(size, mtime) or None when the file is missing"""
+        try:
+            stat_result = await asyncio.to_thread(os.stat, self.local_path(key))
+        except FileNotFoundError:
+            return None
+        return stat_result.st_size, stat_result.st_mtime
+
+    def _delete(self, keys: list) -> int:
+        removed = 0
+        for key in keys:
+            path = self.local_path(key)
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            for suffix in SIBLING_SUFFIXES:
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    async def delete(self, keys: list) -> int:
+        return await run_in_image_pool(self._delete, keys)
+
+    def scan(self):
+        """Yield (key, size, mtime) for every stored file (blocking; run it in a thread)"""
+        for directory, subdirs, files in os.walk(self.root):
+            # Derived assets (e.g. .variants) manage their own lifetime
+            subdirs[:] = [name for name in subdirs if not name.startswith(".")]
+            for name in files:
+                if name.startswith(".") or name.endswith(SIBLING_SUFFIXES):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat_result = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                yield key, stat_result.st_size, stat_result.st_mtime
+
+    def url(self, key: str) -> str:
+        return f"{settings.SERVER_HOST}/media/{key}"
+
+
+# ✅ Any S3-compatible object store (AWS S3, MinIO, R2, ...)
+class S3Storage:
+    """
+    boto3 is blocking, so every call runs in a worker thread; uploads never
+    hold up the event loop. URLs come from S3_PUBLIC_URL when set (public
+    bucket or CDN), otherwise they are presigned.
+    """
+
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str = None, region: str = None):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise StorageError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+        if not bucket:
+            raise StorageError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=Config(max_pool_connections=max(10, settings.IMAGE_THREAD_WORKERS * 2)),
+        )
+
+    def local_path(self, key: str):
+        return None
+
+    async def put(self, key: str, data: bytes, content_type: str = "image/png", immutable: bool = True) -> str:
+        with STAGE_SECONDS.time(stage="write"):
+            await asyncio.to_thread(
+                self.client.put_object,
+                Bucket=self.bucket,
+                Key=self.prefix + key,
+                Body=data,
+                ContentType=content_type,
+                CacheControl=IMMUTABLE_CACHE_CONTROL if immutable else "no-cache",
+            )
+        return key
+
+    @staticmethod
+    def _is_missing(error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    async def stat(self, key: str):
+        try:
+            head = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self.prefix + key)
+        except self.client.exceptions.ClientError as e:
+            if self._is_missing(e):
+                return None
+            raise
+        return head["ContentLength"], head["LastModified"].timestamp()
+
+    def _read(self, key: str):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self.client.exceptions.ClientError as e:
+            if self._is_missing(e):
+                return None
+            raise
+        return response["Body"].read()
+
+    async def read(self, key: str):
+        return await asyncio.to_thread(self._read, key)
+
+    def _delete(self, keys: list) -> int:
+        removed = 0
+        for i in range(0, len(keys), 1000):  # DeleteObjects limit
+            chunk = [{"Key": self.prefix + key} for key in keys[i:i + 1000]]
+            response = self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": chunk, "Quiet": True})
+            removed += len(chunk) - len(response.get("Errors", []))
+        return removed
+
+    async def delete(self, keys: list) -> int:
+        return await asyncio.to_thread(self._delete, keys)
+
+    def scan(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):], item["Size"], item["LastModified"].timestamp()
+
+    def url(self, key: str) -> str:
+        if settings.S3_PUBLIC_URL:
+            return f"{settings.S3_PUBLIC_URL.rstrip('/')}/{self.prefix}{key}"
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self.prefix + key},
+            ExpiresIn=settings.S3_URL_EXPIRY_SECONDS,
+        )
+
+
+def create_storage(name: str = None):
+    name = (name or settings.STORAGE_BACKEND).lower()
+    if name == "local":
+        return LocalStorage(settings.OUTPUT_DIR)
+    if name == "s3":
+        return S3Storage(settings.S3_BUCKET, settings.S3_PREFIX, settings.S3_ENDPOINT_URL, settings.S3_REGION)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{name}' (expected local or s3)")
+
+
+storage = create_storage()
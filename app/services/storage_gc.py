@@ -0,0 +1,179 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+from sqlalchemy import select, delete
+from core.config import settings
+from core.database import SessionLocal
+from core.logger import logger
+from models.image_log import ImageLog
+from models.edit_result import EditResult
+from services.storage import storage
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-worker lock, passes are idempotent anyway
+    fcntl = None
+
+
+class StorageGC:
+    """
+    Background garbage collector for stored images.
+
+    Every `interval` seconds one worker per host (file lock) deletes images
+    older than `retention_seconds`, then the oldest remaining ones while the
+    store is above `max_bytes`, together with the ImageLog / EditResult rows
+    pointing at them, and finally any rows past the retention period. Files and rows are deleted `batch_size` at a time
+    so a large backlog never turns into one huge delete.
+    """
+
+    def __init__(self, storage, retention_seconds: float, max_bytes: int, interval: float, batch_size: int,
+                 lock_path: str):
+        self.storage = storage
+        self.retention_seconds = retention_seconds
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock_path = lock_path
+        self._task = None
+        self.runs = 0
+        self.files_deleted = 0
+        self.bytes_freed = 0
+        self.rows_deleted = 0
+        self.last_run_seconds = 0.0
+
+    def start(self):
+        if self._task is None and self.interval > 0 and (self.retention_seconds or self.max_bytes):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Storage GC pass failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _try_lock(self):
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        handle = open(self.lock_path, "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+        return handle
+
+    def _select(self, now: float) -> list:
+        """(key, size) of files to delete: expired first, then the oldest until under max_bytes"""
+        cutoff = now - self.retention_seconds if self.retention_seconds else None
+        expired, kept = [], []
+        for key, size, mtime in self.storage.scan():
+            if cutoff is not None and mtime < cutoff:
+                expired.append((key, size))
+            else:
+                kept.append((mtime, key, size))
+
+        total = sum(size for _, _, size in kept)
+        if self.max_bytes and total > self.max_bytes:
+            for _, key, size in sorted(kept):
+                expired.append((key, size))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        return expired
+
+    async def _delete_old_rows(self, model, cutoff: float) -> int:
+        """Delete `model` rows older than `cutoff` in primary-key batches"""
+        deleted = 0
+        cutoff_dt = datetime.utcfromtimestamp(cutoff)  # rows are stamped with utcnow()
+        while True:
+            async with SessionLocal() as db:
+                ids = (await db.execute(
+                    select(model.id)
+                    .where(model.created_at < cutoff_dt)
+                    .order_by(model.id)
+                    .limit(self.batch_size)
+                )).scalars().all()
+                if not ids:
+                    return deleted
+                await db.execute(delete(model).where(model.id.in_(ids)))
+                await db.commit()
+            deleted += len(ids)
+            if len(ids) < self.batch_size:
+                return deleted
+
+    async def _delete_rows_for(self, model, keys: list) -> int:
+        """Delete `model` rows pointing at `keys`, stored as keys or legacy OUTPUT_DIR paths"""
+        prefix = settings.OUTPUT_DIR.replace(os.sep, "/").rstrip("/") + "/"
+        paths = keys + [prefix + key for key in keys]
+        if os.sep != "/":
+            paths += [path.replace("/", os.sep) for path in paths]
+        async with SessionLocal() as db:
+            result = await db.execute(delete(model).where(model.image_path.in_(paths)))
+            await db.commit()
+        return result.rowcount or 0
+
+    async def run_once(self) -> dict:
+        """One GC pass; returns what it removed (empty if another worker holds the lock)"""
+        lock = await asyncio.to_thread(self._try_lock)
+        if not lock:
+            return {}
+        started = time.monotonic()
+        now = time.time()
+        try:
+            candidates = await asyncio.to_thread(self._select, now)
+            files = freed = rows = 0
+            for i in range(0, len(candidates), self.batch_size):
+                batch = candidates[i:i + self.batch_size]
+                keys = [key for key, _ in batch]
+                files += await self.storage.delete(keys)
+                freed += sum(size for _, size in batch)
+                # Rows of files evicted for size are younger than the retention cutoff
+                rows += await self._delete_rows_for(ImageLog, keys)
+                rows += await self._delete_rows_for(EditResult, keys)
+
+            if self.retention_seconds:
+                rows = await self._delete_old_rows(ImageLog, now - self.retention_seconds)
+                # Edit cache entries pointing at files that are now gone
+                rows += await self._delete_old_rows(EditResult, now - self.retention_seconds)
+        finally:
+            if lock is not True:
+                lock.close()
+
+        self.runs += 1
+        self.files_deleted += files
+        self.bytes_freed += freed
+        self.rows_deleted += rows
+        self.last_run_seconds = time.monotonic() - started
+        if files or rows:
+            logger.info(f"Storage GC removed {files} file(s) ({freed} bytes) and {rows} database row(s)")
+        return {"files": files, "bytes": freed, "rows": rows}
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "files_deleted": self.files_deleted,
+            "bytes_freed": self.bytes_freed,
+            "rows_deleted": self.rows_deleted,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+
+storage_gc = StorageGC(
+    storage,
+    retention_seconds=settings.STORAGE_RETENTION_DAYS * 24 * 3600,
+    max_bytes=settings.STORAGE_MAX_BYTES if storage.name == "local" else 0,
+    interval=settings.STORAGE_GC_INTERVAL_SECONDS,
+    batch_size=settings.STORAGE_GC_BATCH_SIZE,
+    lock_path=os.path.join(settings.OUTPUT_DIR, ".gc.lock"),
+)
@@ -0,0 +1,155 @@
+import io
+import os
+import time
+import asyncio
+import hashlib
+from PIL import Image, features
+from core.config import settings
+from core.logger import logger
+from services.image_processing import run_in_encode_pool, write_file_atomic
+from services.single_flight import SingleFlight
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-worker lock
+    fcntl = None
+
+VARIANT_DIR = os.path.join(settings.OUTPUT_DIR, ".variants")
+
+# fmt query value -> (Pillow format, file extension)
+VARIANT_FORMATS = {
+    "png": ("PNG", "png"),
+    "jpeg": ("JPEG", "jpg"),
+    "jpg": ("JPEG", "jpg"),
+    "webp": ("WEBP", "webp"),
+}
+if features.check("avif"):
+    VARIANT_FORMATS["avif"] = ("AVIF", "avif")
+
+
+class VariantError(Exception):
+    pass
+
+
+# ✅ Runs in the encode pool (module-level so it can be pickled to a process)
+def render_variant(source_path: str, output_path: str, width: int, image_format: str, quality: int) -> int:
+    """Resize (never upscale) and re-encode `source_path`; returns the output size in bytes"""
+    with Image.open(source_path) as image:
+        if width and image.width > width:
+            image.draft("RGB", (width, width * image.height // image.width))
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        if image_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        save_kwargs = {} if image_format == "PNG" else {"quality": quality}
+        image.save(buffer, image_format, **save_kwargs)
+    data = buffer.getvalue()
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    write_file_atomic(output_path, data)
+    return len(data)
+
+
+class VariantCache:
+    """
+    Byte-bounded LRU over the derived-asset directory, shared by every worker.
+
+    The directory itself is the index: a hit bumps the file's mtime, and after
+    each render one worker at a time (file lock) scans the directory and
+    deletes the least recently used files until it is back under max_bytes.
+    """
+
+    # Hits closer together than this don't rewrite the mtime
+    TOUCH_INTERVAL_SECONDS = 60
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock_path = os.path.join(directory, ".lock")
+
+    def touch(self, path: str) -> bool:
+        """True if `path` is still on disk (another worker may have evicted it)"""
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            return False
+        now = time.time()
+        if now - stat_result.st_mtime > self.TOUCH_INTERVAL_SECONDS:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                return False
+        return True
+
+    def _scan(self):
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith(".") and not entry.name.endswith(".tmp"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, entry.path, stat.st_size))
+        return sorted(files)
+
+    def trim(self) -> int:
+        """Delete the least recently used variants until under max_bytes; returns files removed"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, "w") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            files = self._scan()
+            total = sum(size for _, _, size in files)
+            removed = 0
+            # Never the newest file, which was just rendered for a waiting request
+            for _, path, size in files[:-1]:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+            return removed
+
+
+variant_cache = VariantCache(VARIANT_DIR, settings.VARIANT_CACHE_MAX_BYTES)
+_variant_flight = SingleFlight()
+
+
+def _variant_path(source_path: str, stat_result: os.stat_result, width: int, extension: str) -> str:
+    # Source mtime/size are part of the key, so a changed original never serves a stale variant
+    source_id = f"{source_path}\x00{stat_result.st_size}\x00{stat_result.st_mtime_ns}"
+    digest = hashlib.sha256(source_id.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(VARIANT_DIR, f"{digest}_w{width or 0}.{extension}")
+
+
+async def get_variant(source_path: str, width: int = None, fmt: str = None) -> str:
+    """
+    Path of the resized / re-encoded variant of `source_path`, rendering it
+    on the encode pool the first time it is requested.
+    """
+    if width is not None and width not in settings.VARIANT_WIDTHS:
+        raise VariantError(f"w must be one of {sorted(settings.VARIANT_WIDTHS)}")
+    fmt = (fmt or os.path.splitext(source_path)[1].lstrip(".") or "png").lower()
+    if fmt not in VARIANT_FORMATS:
+        raise VariantError(f"fmt must be one of {sorted(VARIANT_FORMATS)}")
+    image_format, extension = VARIANT_FORMATS[fmt]
+
+    stat_result = await asyncio.to_thread(os.stat, source_path)
+    output_path = _variant_path(source_path, stat_result, width, extension)
+    if await asyncio.to_thread(variant_cache.touch, output_path):
+        return output_path
+
+    async def render():
+        await run_in_encode_pool(
+            render_variant, source_path, output_path, width, image_format, settings.VARIANT_QUALITY
+        )
+        evicted = await asyncio.to_thread(variant_cache.trim)
+        if evicted:
+            logger.info(f"Variant cache evicted {evicted} file(s)")
+        return output_path
+
+    return await _variant_flight.do(output_path, render)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app imports its packages from app/ (e.g. `from core.config import settings`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
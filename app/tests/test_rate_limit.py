@@ -0,0 +1,39 @@
+import multiprocessing
+
+import pytest
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+
+from core.rate_limit import SQLiteStorage
+
+LIMIT = "20/minute"
+HITS_PER_PROCESS = 30
+
+STRATEGIES = {
+    "fixed-window": FixedWindowRateLimiter,
+    "sliding-window-counter": SlidingWindowCounterRateLimiter,
+}
+
+
+def _hit_limit(db_path: str, strategy: str, start, results):
+    limiter = STRATEGIES[strategy](SQLiteStorage(f"sqlite:///{db_path}"))
+    item = parse(LIMIT)
+    start.wait()
+    results.put(sum(limiter.hit(item, "test", "client") for _ in range(HITS_PER_PROCESS)))
+
+
+@pytest.mark.parametrize("strategy", sorted(STRATEGIES))
+def test_two_processes_share_one_limit(tmp_path, strategy):
+    """Two workers hitting the same SQLite counters together allow exactly the limit"""
+    context = multiprocessing.get_context("spawn")
+    start, results = context.Barrier(2), context.Queue()
+    db_path = str(tmp_path / "ratelimit.db")
+    workers = [context.Process(target=_hit_limit, args=(db_path, strategy, start, results)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    allowed = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=10)
+        assert worker.exitcode == 0
+
+    assert sum(allowed) == parse(LIMIT).amount
@@ -1,21 +1,11 @@
 
 from models.error_log import ErrorLog
-from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime
 from core.logger import logger
+from core.metrics import SERVICE_ERRORS
+from services.log_writer import log_writer
 
-async def log_error(db: AsyncSession, source: str, error_type: str, message: str, prompt: str = None):
-    """Logs error to database and local log file."""
-    try:
-        new_log = ErrorLog(
-            source=source,
-            error_type=error_type,
-            message=message,
-            prompt=prompt,
-            created_at=datetime.utcnow()
-        )
-        db.add(new_log)
-        await db.commit()
-        logger.error(f"[{source}] {error_type}: {message}")
-    except Exception as e:
-        logger.error(f"Failed to log error: {e}")
\ No newline at end of file
+def log_error(source: str, error_type: str, message: str, prompt: str = None):
+    """Logs error to the local log file and queues it for a batched database write."""
+    logger.error(f"[{source}] {error_type}: {message}")
+    SERVICE_ERRORS.inc(source=source, error_type=error_type)
+    log_writer.add(ErrorLog, source=source, error_type=error_type, message=message, prompt=prompt)
@@ -1,4 +1,9 @@
 from fastapi.responses import JSONResponse
+from services.storage import storage, normalize_key
+
+def build_image_url(path: str) -> str:
+    """Public URL for a stored image (a storage key, or a legacy generated_images/ path)"""
+    return storage.url(normalize_key(path))
 
 def success_response(message: str, image_url: str = None):
     return JSONResponse(
@@ -11,3 +16,8 @@ def error_response(message: str, code: int = 500):
         status_code=code,
         content={"status": False, "message": message},
     )
+
+def quota_exceeded_response(retry_after: float):
+    response = error_response("Image quota exceeded, try again later", 429)
+    response.headers["Retry-After"] = str(int(retry_after + 0.999))
+    return response